@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items()) if v is not None}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def cache_key(model: str, input: Dict[str, Any]) -> str:
+    """Canonical content hash of a generation request.
+
+    Key order, ``None`` values, whitespace runs in strings and ``28.0`` vs
+    ``28`` do not change the key.
+    """
+    canonical = json.dumps(
+        {"model": model.strip().lower(), "input": _normalize(input)},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def is_pinned(model: str) -> bool:
+    """``owner/name:version`` always runs the same weights; a bare
+    ``owner/name`` follows the model's latest version."""
+    return ":" in model
+
+
+def is_cacheable(input: Dict[str, Any]) -> bool:
+    """Only seeded requests are deterministic; unseeded ones must hit the model."""
+    seed = input.get("seed")
+    return isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class ResultCache:
+    """Two-tier generation result cache.
+
+    A bounded in-memory LRU sits in front of an on-disk store. Each disk
+    entry is a directory ``<root>/<key[:2]>/<key>/`` holding ``meta.json``
+    (the completed prediction) and, optionally, the downloaded output files.
+    Entries expire after ``ttl`` seconds, or sooner when ``put`` is given a
+    shorter one, and the disk tier evicts the oldest entries once it grows
+    past ``max_bytes``.
+    """
+
+    def __init__(self, root: str, memory_entries: int = 1024, ttl: float = 7 * 86400,
+                 max_bytes: int = 1 << 30):
+        self.root = Path(root)
+        self.memory_entries = memory_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        # key -> (expires_at, value); expires_at is None for entries that never expire.
+        self._memory: "OrderedDict[str, Tuple[Optional[float], Dict[str, Any]]]" = OrderedDict()
+        # key -> (stored_at, size in bytes, expires_at) for everything on disk.
+        self._disk_index: Dict[str, Tuple[float, int, Optional[float]]] = {}
+        self._disk_bytes = 0
+        self._lock = asyncio.Lock()
+        self._loaded = False
+
+    def _entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _expires_at(self, stored_at: float, ttl: Optional[float] = None) -> Optional[float]:
+        if ttl is None or (self.ttl > 0 and ttl > self.ttl):
+            ttl = self.ttl
+        return stored_at + ttl if ttl > 0 else None
+
+    @staticmethod
+    def _expired(expires_at: Optional[float]) -> bool:
+        return expires_at is not None and time.time() > expires_at
+
+    # -- memory tier -------------------------------------------------------
+
+    def _memory_get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self._expired(expires_at):
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, expires_at: Optional[float], value: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    # -- disk tier (runs in a worker thread) -------------------------------
+
+    def _load_index(self) -> None:
+        if not self.root.exists():
+            return
+        for meta in self.root.glob("*/*/meta.json"):
+            entry = meta.parent
+            try:
+                record = json.loads(meta.read_text())
+                stored_at = record["stored_at"]
+                expires_at = record.get("expires_at", self._expires_at(stored_at))
+                size = sum(f.stat().st_size for f in entry.iterdir())
+            except (OSError, ValueError, KeyError):
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            self._disk_index[entry.name] = (stored_at, size, expires_at)
+            self._disk_bytes += size
+
+    def _disk_read(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self._entry_dir(key) / "meta.json").read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _disk_write(self, key: str, record: Dict[str, Any], assets: List[Tuple[str, bytes]]) -> int:
+        entry = self._entry_dir(key)
+        tmp = entry.with_name(f".{key}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, data in assets:
+            (tmp / name).write_bytes(data)
+        (tmp / "meta.json").write_text(json.dumps(record))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+        return sum(f.stat().st_size for f in entry.iterdir())
+
+    def _disk_remove(self, key: str) -> None:
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+        _, size, _ = self._disk_index.pop(key, (0, 0, None))
+        self._disk_bytes -= size
+
+    def _evict_disk(self) -> List[str]:
+        """Remove the oldest entries until the disk tier fits ``max_bytes``;
+        returns their keys for the caller to drop from memory on the loop."""
+        evicted: List[str] = []
+        if self._disk_bytes <= self.max_bytes:
+            return evicted
+        for key, _ in sorted(self._disk_index.items(), key=lambda item: item[1][0]):
+            if self._disk_bytes <= self.max_bytes:
+                break
+            self._disk_remove(key)
+            evicted.append(key)
+        return evicted
+
+    async def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            await asyncio.to_thread(self._load_index)
+            self._loaded = True
+
+    # -- public API --------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.stats.memory_hits += 1
+            return value
+
+        async with self._lock:
+            await self._ensure_loaded()
+            indexed = self._disk_index.get(key)
+            if indexed is None:
+                self.stats.misses += 1
+                return None
+            if self._expired(indexed[2]):
+                await asyncio.to_thread(self._disk_remove, key)
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            record = await asyncio.to_thread(self._disk_read, key)
+            if record is None:
+                await asyncio.to_thread(self._disk_remove, key)
+                self.stats.misses += 1
+                return None
+
+        self._memory_put(key, indexed[2], record["value"])
+        self.stats.disk_hits += 1
+        return record["value"]
+
+    async def put(self, key: str, value: Dict[str, Any],
+                  assets: Optional[List[Tuple[str, bytes]]] = None, ttl: Optional[float] = None) -> None:
+        """Store ``value`` (and optional ``(filename, bytes)`` assets) under
+        ``key``. ``ttl`` shortens the cache-wide lifetime for this entry."""
+        stored_at = time.time()
+        expires_at = self._expires_at(stored_at, ttl)
+        if assets:
+            value = {**value, "cached_assets": [name for name, _ in assets]}
+        self._memory_put(key, expires_at, value)
+        record = {"stored_at": stored_at, "expires_at": expires_at, "value": value}
+        async with self._lock:
+            await self._ensure_loaded()
+            try:
+                size = await asyncio.to_thread(self._disk_write, key, record, assets or [])
+            except OSError as exc:
+                logger.warning("Failed to write cache entry %s: %s", key, exc)
+                return
+            _, old_size, _ = self._disk_index.get(key, (0, 0, None))
+            self._disk_index[key] = (stored_at, size, expires_at)
+            self._disk_bytes += size - old_size
+            self.stats.stores += 1
+            evicted = await asyncio.to_thread(self._evict_disk)
+        for evicted_key in evicted:
+            self._memory.pop(evicted_key, None)
+        self.stats.evictions += len(evicted)
+
+    def asset_path(self, key: str, name: str) -> Path:
+        return self._entry_dir(key) / name
+
+    async def invalidate(self, key: str) -> None:
+        self._memory.pop(key, None)
+        async with self._lock:
+            await self._ensure_loaded()
+            await asyncio.to_thread(self._disk_remove, key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "memory_entries": len(self._memory),
+            "disk_entries": len(self._disk_index),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+@lru_cache
+def get_result_cache() -> ResultCache:
+    settings = get_settings()
+    return ResultCache(
+        settings.cache_dir,
+        memory_entries=settings.cache_memory_entries,
+        ttl=settings.cache_ttl,
+        max_bytes=settings.cache_max_bytes,
+    )
@@ -0,0 +1,147 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str) -> Tuple[str, ...]:
+    value = os.getenv(name) or ""
+    return tuple(item.strip().lower() for item in value.split(",") if item.strip())
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Runtime configuration read from the environment (see .env.example)."""
+
+    replicate_api_token: Optional[str]
+    replicate_api_base: str
+    # Externally reachable base URL of this API, used to build webhook URLs.
+    public_base_url: str
+    replicate_webhook_secret: Optional[str]
+    # Accept unsigned webhooks when no secret is set. Only for local fakes:
+    # anyone who can reach /predictions/webhook can then post results.
+    replicate_webhook_allow_unsigned: bool
+
+    http_max_connections: int
+    http_max_keepalive: int
+    http_timeout: float
+    # Providers whose client is built and connection pool opened at startup.
+    # Empty means everything is loaded lazily on first use.
+    warm_providers: Tuple[str, ...]
+
+    # How many predictions to keep in memory before evicting finished ones.
+    prediction_store_size: int
+
+    cache_dir: str
+    cache_memory_entries: int
+    cache_ttl: float
+    cache_max_bytes: int
+    # Also download and keep the output files, not just the prediction metadata.
+    cache_store_assets: bool
+    # Lifetime of entries whose outputs are still provider URLs (no stored
+    # assets); Replicate deletes API prediction outputs after an hour.
+    cache_url_ttl: float
+    # Lifetime of entries for models named without a version (owner/name),
+    # whose latest version can change.
+    cache_unpinned_ttl: float
+
+    # JSON overrides of the per-provider limits in app.core.scheduler.
+    provider_limits: Optional[str]
+    scheduler_slot_timeout: float
+    # Seconds a POST /predictions may wait for a scheduler slot before a 503.
+    scheduler_admission_timeout: float
+
+    batch_max_items: int
+    batch_concurrency: int
+    batch_max_concurrency: int
+    # Seconds a single batch item may take before it is reported as failed.
+    batch_item_timeout: float
+    # Finished batch jobs kept for resuming before the oldest are dropped.
+    batch_store_size: int
+
+    # Defaults to prompt_dir.txt at the repository root.
+    prompt_directive_path: Optional[str]
+    # Defaults to frontend/constants/promptPresets.json, shared with the frontend.
+    prompt_presets_path: Optional[str]
+    prompt_cache_size: int
+    openai_api_key: Optional[str]
+    openai_prompt_model: str
+
+    assets_dir: str
+    derivatives_dir: str
+    assets_max_age: int
+    # Worker processes for thumbnails/WebP and how many may run at once.
+    derivative_workers: int
+    derivative_concurrency: int
+
+    history_db_path: str
+    # History writes are buffered and flushed together at this interval.
+    history_flush_interval: float
+    history_batch_size: int
+
+    log_level: str
+    # Share of successful requests written to the access log.
+    monitoring_sample_rate: float
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings(
+        replicate_api_token=os.getenv("REPLICATE_API_TOKEN"),
+        replicate_api_base=os.getenv("REPLICATE_API_BASE", "https://api.replicate.com/v1").rstrip("/"),
+        public_base_url=os.getenv("PUBLIC_BASE_URL", os.getenv("BACKEND_URL", "http://localhost:8000")).rstrip("/"),
+        replicate_webhook_secret=os.getenv("REPLICATE_WEBHOOK_SECRET") or None,
+        replicate_webhook_allow_unsigned=_env_bool("REPLICATE_WEBHOOK_ALLOW_UNSIGNED", False),
+        http_max_connections=_env_int("HTTP_MAX_CONNECTIONS", 100),
+        http_max_keepalive=_env_int("HTTP_MAX_KEEPALIVE", 20),
+        http_timeout=_env_float("HTTP_TIMEOUT", 30.0),
+        warm_providers=_env_list("WARM_PROVIDERS"),
+        prediction_store_size=_env_int("PREDICTION_STORE_SIZE", 10000),
+        cache_dir=os.getenv("CACHE_DIR", ".cache/results"),
+        cache_memory_entries=_env_int("CACHE_MEMORY_ENTRIES", 1024),
+        cache_ttl=_env_float("CACHE_TTL", 7 * 86400),
+        cache_max_bytes=_env_int("CACHE_MAX_BYTES", 1 << 30),
+        cache_store_assets=_env_bool("CACHE_STORE_ASSETS", False),
+        cache_url_ttl=_env_float("CACHE_URL_TTL", 3300),
+        cache_unpinned_ttl=_env_float("CACHE_UNPINNED_TTL", 86400),
+        provider_limits=os.getenv("PROVIDER_LIMITS") or None,
+        scheduler_slot_timeout=_env_float("SCHEDULER_SLOT_TIMEOUT", 600.0),
+        scheduler_admission_timeout=_env_float("SCHEDULER_ADMISSION_TIMEOUT", 30.0),
+        batch_max_items=_env_int("BATCH_MAX_ITEMS", 1000),
+        batch_concurrency=_env_int("BATCH_CONCURRENCY", 8),
+        batch_max_concurrency=_env_int("BATCH_MAX_CONCURRENCY", 32),
+        batch_item_timeout=_env_float("BATCH_ITEM_TIMEOUT", 900.0),
+        batch_store_size=_env_int("BATCH_STORE_SIZE", 200),
+        prompt_directive_path=os.getenv("PROMPT_DIRECTIVE_PATH") or None,
+        prompt_presets_path=os.getenv("PROMPT_PRESETS_PATH") or None,
+        prompt_cache_size=_env_int("PROMPT_CACHE_SIZE", 4096),
+        openai_api_key=os.getenv("OPENAI_API_KEY") or None,
+        openai_prompt_model=os.getenv("OPENAI_PROMPT_MODEL", "gpt-4"),
+        assets_dir=os.getenv("ASSETS_DIR", "uploads"),
+        derivatives_dir=os.getenv("DERIVATIVES_DIR", ".cache/derivatives"),
+        assets_max_age=_env_int("ASSETS_MAX_AGE", 3600),
+        derivative_workers=_env_int("DERIVATIVE_WORKERS", min(os.cpu_count() or 2, 4)),
+        derivative_concurrency=_env_int("DERIVATIVE_CONCURRENCY", 4),
+        history_db_path=os.getenv("HISTORY_DB_PATH", ".data/history.sqlite3"),
+        history_flush_interval=_env_float("HISTORY_FLUSH_INTERVAL", 0.05),
+        history_batch_size=_env_int("HISTORY_BATCH_SIZE", 500),
+        log_level=os.getenv("LOG_LEVEL", "info"),
+        monitoring_sample_rate=_env_float("MONITORING_SAMPLE_RATE", 0.1),
+    )
@@ -0,0 +1,42 @@
+import logging
+from typing import TYPE_CHECKING, Optional
+
+from app.core.config import get_settings
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["httpx.AsyncClient"] = None
+
+
+def get_http_client() -> "httpx.AsyncClient":
+    """Return the process-wide pooled HTTP client, creating it on first use.
+
+    Every outbound provider call goes through this client so keep-alive
+    connections are reused instead of paying a TLS handshake per request.
+    httpx is imported here rather than at module level so cold starts that
+    never reach a provider do not pay for it.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        import httpx
+
+        settings = get_settings()
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.http_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive,
+            ),
+        )
+        logger.info("Created shared HTTP client")
+    return _client
+
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
@@ -0,0 +1,36 @@
+import os
+
+# Widths derivatives are snapped to, so arbitrary ?w= values cannot fill the disk.
+DERIVATIVE_WIDTHS = (64, 128, 256, 512, 1024, 2048)
+DERIVATIVE_FORMATS = {"webp": "WEBP", "jpeg": "JPEG", "png": "PNG"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tiff"}
+
+
+def snap_width(width: int) -> int:
+    for allowed in DERIVATIVE_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return DERIVATIVE_WIDTHS[-1]
+
+
+def make_derivative(source: str, destination: str, width: int, fmt: str, quality: int = 82) -> None:
+    """Resize ``source`` to at most ``width`` pixels wide and encode it as ``fmt``.
+
+    Runs in a worker process; Pillow is imported there so the web process
+    never pays for it.
+    """
+    from PIL import Image
+
+    with Image.open(source) as image:
+        image.seek(0)
+        if width and image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        elif image.mode == "P":
+            image = image.convert("RGBA")
+
+        tmp = f"{destination}.{os.getpid()}.tmp"
+        image.save(tmp, DERIVATIVE_FORMATS[fmt], quality=quality, optimize=True)
+    os.replace(tmp, destination)
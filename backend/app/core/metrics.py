@@ -0,0 +1,216 @@
+"""Minimal in-process metrics with Prometheus text exposition.
+
+Everything here is updated from the event loop only, so no locking is
+needed and an observation costs a dict lookup and a bisect.
+"""
+import math
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# Seconds; covers sub-millisecond cache hits up to multi-minute video jobs.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 120.0, 300.0, 600.0)
+
+LabelValues = Tuple[str, ...]
+
+# Distinct model label values kept before further ones are folded into "other".
+MAX_MODEL_LABELS = 100
+_MODEL_NAME_RE = re.compile(r"^[\w.-]+/[\w.-]+$")
+_model_labels: Set[str] = set()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def model_label(model: Optional[str]) -> str:
+    """Bound the ``model`` label, which comes from client input: ``owner/name``
+    without the version, and only the first ``MAX_MODEL_LABELS`` distinct
+    names. Anything else is reported as ``other``."""
+    name = (model or "").split(":", 1)[0].strip().lower()
+    if not _MODEL_NAME_RE.match(name):
+        return "other"
+    if name not in _model_labels:
+        if len(_model_labels) >= MAX_MODEL_LABELS:
+            return "other"
+        _model_labels.add(name)
+    return name
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def expose(self) -> Iterable[str]:
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside its bucket,
+        the same way PromQL's ``histogram_quantile`` does."""
+        series = self._series.get(self._key(labels))
+        if series is None:
+            return None
+        return self._quantile(q, series[0])
+
+    def _quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> List[Dict[str, object]]:
+        rows = []
+        for key, (counts, total) in self._series.items():
+            count = sum(counts)
+            rows.append({
+                **dict(zip(self.label_names, key)),
+                "count": count,
+                "mean": total[0] / count if count else None,
+                "p50": self._quantile(0.5, counts),
+                "p95": self._quantile(0.95, counts),
+                "p99": self._quantile(0.99, counts),
+            })
+        return rows
+
+    def expose(self) -> Iterable[str]:
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.label_names, key)
+            yield f"{self.name}_sum{labels} {_format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, List[Dict[str, object]]]:
+        return {
+            name: metric.summary()
+            for name, metric in self._metrics.items()
+            if isinstance(metric, Histogram)
+        }
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests handled.", ("method", "route", "status")))
+HTTP_ERRORS = REGISTRY.register(Counter(
+    "http_request_errors_total", "HTTP requests that failed with a 5xx or an exception.", ("method", "route")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled."))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request.", ("method", "route")))
+
+PROVIDER_QUEUE = REGISTRY.register(Histogram(
+    "provider_queue_seconds", "Time spent waiting for a scheduler slot and rate-limit token.",
+    ("provider", "model")))
+PROVIDER_REQUEST = REGISTRY.register(Histogram(
+    "provider_request_seconds", "Duration of HTTP calls to a provider API.",
+    ("provider", "operation", "status")))
+PROVIDER_ERRORS = REGISTRY.register(Counter(
+    "provider_errors_total", "Provider API calls that failed.", ("provider", "operation", "status")))
+PROVIDER_IN_FLIGHT = REGISTRY.register(Gauge(
+    "provider_predictions_in_flight", "Upstream predictions currently running.", ("provider",)))
+PREDICTION_TOTAL = REGISTRY.register(Histogram(
+    "prediction_total_seconds", "Time from accepting a prediction to its terminal status.",
+    ("provider", "model", "status")))
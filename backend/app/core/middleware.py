@@ -0,0 +1,62 @@
+import logging
+import random
+import time
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import HTTP_ERRORS, HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+
+access_logger = logging.getLogger("app.access")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status counts and
+    in-flight requests, and logging a sample of requests.
+
+    Only method, route, status, duration and request id are logged, never
+    headers or bodies. Server errors are always logged; other requests with
+    probability ``sample_rate``.
+    """
+
+    def __init__(self, app: ASGIApp, sample_rate: float = 0.1):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        request_id = uuid.uuid4().hex
+        status = 500
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            duration = time.perf_counter() - start
+            method = scope["method"]
+            # The route template keeps label cardinality bounded.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_LATENCY.observe(duration, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+            if status >= 500:
+                HTTP_ERRORS.inc(method=method, route=route)
+            if status >= 500 or random.random() < self.sample_rate:
+                access_logger.info(
+                    "%s %s %d %.1fms request_id=%s",
+                    method, scope["path"], status, duration * 1000, request_id,
+                )
@@ -0,0 +1,490 @@
+"""Prometheus prompt engine.
+
+Enhances prompts locally following the rules in ``prompt_dir.txt``: image
+prompts become prioritised keyword groups that fit the model's token chunk,
+video prompts become 3-4 sentences of ~75-100 words running camera ->
+action -> atmosphere. The directive and the style/genre presets shared
+with the frontend (``frontend/constants/promptPresets.json``) are compiled
+into lookup tables once, and results for repeated inputs are memoized.
+"""
+import hashlib
+import json
+import logging
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.providers import get_provider
+
+logger = logging.getLogger(__name__)
+
+IMAGE = "image"
+VIDEO = "video"
+
+# Relative weight of each keyword layer (frontend/constants/promptGuide.ts).
+# Heavier layers are placed first and trimmed last.
+LAYER_WEIGHTS = {
+    "subject": 1.0,
+    "style": 0.8,
+    "mood": 0.7,
+    "lighting": 0.65,
+    "technical": 0.6,
+}
+
+# Layer -> keywords for one style or genre.
+Preset = Dict[str, Tuple[str, ...]]
+# Sub-genres from docs/features/genres-and-styles.md inherit their parent's
+# enhancers (science fiction has none yet, so only its mood keyword).
+SUBGENRES = {
+    "fantasy": ("high fantasy", "urban fantasy", "dark fantasy", "fairy tale", "sword & sorcery",
+                "mythological", "contemporary fantasy", "epic fantasy", "portal fantasy"),
+    "science fiction": ("space opera", "cyberpunk", "post-apocalyptic", "hard sci-fi", "time travel",
+                        "dystopian", "first contact", "military sci-fi", "biopunk", "steampunk",
+                        "space western", "afrofuturism"),
+    "horror": ("gothic", "cosmic horror", "psychological horror", "body horror", "folk horror",
+               "supernatural", "slasher", "zombie", "found footage", "haunted house", "monster",
+               "survival horror"),
+}
+
+CAMERA_SHOTS = ("sweeping aerial shot", "dynamic tracking shot", "slow dolly shot", "cinematic wide shot")
+# Filler for video prompts shorter than the directive's minimum sentence count.
+SCENE_DETAILS = (
+    "Subtle movement and fine textures bring every element of the scene to life.",
+    "Environmental details shift naturally as the scene progresses.",
+    "Background elements drift gently, adding depth and continuity to the motion.",
+)
+# Clauses that lengthen generated sentences towards the directive's word
+# target, keyed by the kind of sentence they extend. User sentences are
+# never lengthened.
+ELABORATIONS = {
+    "camera": (
+        "moving steadily to reveal the full scale of the surroundings",
+        "framing the subject clearly against a richly layered background",
+        "keeping the action centred as the perspective gradually widens",
+    ),
+    "detail": (
+        "while small shifts in light and motion keep the frame alive",
+        "with crisp, natural textures on every surface in view",
+        "as the camera holds a smooth and deliberate pace",
+    ),
+    "atmosphere": (
+        "as the light shifts slowly across the scene",
+        "an impression that lingers through the final frame",
+        "with soft haze and gentle contrast deepening the sense of space",
+    ),
+}
+CAMERA_TERMS = ("shot", "camera", "angle", "close-up", "closeup", "pan", "dolly", "aerial", "tracking", "zoom")
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+_WORD_RE = re.compile(r"\w")
+
+
+def count_tokens(text: str) -> int:
+    """Rough CLIP-style token count: words and punctuation marks."""
+    return len(_TOKEN_RE.findall(text))
+
+
+def _range(text: str, pattern: str, default: Tuple[int, int]) -> Tuple[int, int]:
+    match = re.search(pattern, text, re.IGNORECASE)
+    return (int(match.group(1)), int(match.group(2))) if match else default
+
+
+@dataclass(frozen=True)
+class Directive:
+    image_elements: Tuple[int, int] = (10, 15)
+    chunk_tokens: int = 75
+    video_sentences: Tuple[int, int] = (3, 4)
+    video_words: Tuple[int, int] = (75, 100)
+    # Keywords per group; the subject group is never trimmed.
+    group_limits: Dict[str, int] = field(default_factory=lambda: {
+        "style": 3, "technical": 3, "lighting": 2, "mood": 2,
+    })
+    # Example keywords from the directive, by category ("lighting", ...).
+    keywords: Dict[str, Tuple[str, ...]] = field(default_factory=dict)
+
+
+def parse_directive(text: str) -> Directive:
+    """Extract length targets and example keywords from ``prompt_dir.txt``."""
+    chunk = re.search(r"within (\d+) tokens per chunk", text, re.IGNORECASE)
+    limits = {}
+    for name, pattern in (
+        ("style", r"Style/medium \((\d+)-(\d+) keywords\)"),
+        ("technical", r"Technical aspects \((\d+)-(\d+) keywords\)"),
+        ("lighting", r"Enhancement details \((\d+)-(\d+) keywords\)"),
+    ):
+        limits[name] = _range(text, pattern, (2, 3))[1]
+    limits["mood"] = limits["lighting"]
+
+    keywords: Dict[str, List[str]] = {}
+    for category, keyword in re.findall(r'^\s*(\w+): "([^"]+)"', text, re.MULTILINE):
+        keywords.setdefault(category.lower(), []).append(keyword.lower())
+
+    return Directive(
+        image_elements=_range(text, r"Target Length: (\d+)-(\d+) key elements", (10, 15)),
+        chunk_tokens=int(chunk.group(1)) if chunk else 75,
+        video_sentences=_range(text, r"(\d+)-(\d+) detailed sentences", (3, 4)),
+        video_words=_range(text, r"Target Length: ~(\d+)-(\d+) words", (75, 100)),
+        group_limits=limits,
+        keywords={k: tuple(v) for k, v in keywords.items()},
+    )
+
+
+@dataclass(frozen=True)
+class Presets:
+    """Style and genre enhancers from ``promptPresets.json``, the file the
+    frontend's ``promptGuide.ts`` reads, so both apply the same keywords."""
+
+    styles: Dict[str, Preset] = field(default_factory=dict)
+    genres: Dict[str, Preset] = field(default_factory=dict)
+    # Always-on quality markers.
+    quality: Tuple[str, ...] = ("highly detailed", "professional", "sharp focus", "high resolution")
+
+
+def parse_presets(data: Dict[str, Any]) -> Presets:
+    def table(entries: Dict[str, Dict[str, List[str]]]) -> Dict[str, Preset]:
+        return {name.lower(): {layer: tuple(words) for layer, words in layers.items()}
+                for name, layers in entries.items()}
+
+    return Presets(
+        styles=table(data.get("styles", {})),
+        genres=table(data.get("genres", {})),
+        quality=tuple(data.get("quality", Presets.quality)),
+    )
+
+
+@dataclass(frozen=True)
+class EnhancedPrompt:
+    prompt: str
+    target: str
+    groups: Tuple[Tuple[str, Tuple[str, ...]], ...]
+    token_count: int
+    source: str = "engine"
+
+
+def target_for_model(model: Optional[str]) -> str:
+    if model and any(name in model.lower() for name in ("luma", "dream-machine", "ray", "kling", "video")):
+        return VIDEO
+    return IMAGE
+
+
+def _uses_break(model: Optional[str]) -> bool:
+    # Stable Diffusion front-ends understand BREAK; Flux reads it as a word.
+    return bool(model) and any(name in model.lower() for name in ("stable-diffusion", "sdxl", "sd3"))
+
+
+def _split_phrases(prompt: str) -> List[str]:
+    phrases, seen = [], set()
+    for phrase in re.split(r"[,\n]|\bBREAK\b", prompt):
+        phrase = " ".join(phrase.split()).strip(" .")
+        if phrase and phrase.lower() not in seen:
+            seen.add(phrase.lower())
+            phrases.append(phrase)
+    return phrases
+
+
+class PromptEngine:
+    def __init__(self, directive: Directive, presets: Optional[Presets] = None, cache_size: int = 4096):
+        presets = presets or Presets()
+        self.directive = directive
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._memo: "OrderedDict[tuple, EnhancedPrompt]" = OrderedDict()
+
+        # Preset name -> layer -> keywords, including sub-genre aliases.
+        self._styles = dict(presets.styles)
+        self._genres = dict(presets.genres)
+        for parent, children in SUBGENRES.items():
+            self._genres.setdefault(parent, {})
+            for child in children:
+                self._genres[child] = self._genres[parent]
+
+        # Default lighting/mood enhancers taken from the directive's examples.
+        self._defaults = {
+            "lighting": directive.keywords.get("lighting", ("dramatic lighting",)),
+            "mood": directive.keywords.get("atmosphere", ("cinematic",)),
+            "technical": presets.quality,
+        }
+
+        # Keyword -> layer, to spot layers the user already covered.
+        self._keyword_layer: Dict[str, str] = {}
+        for group in (self._styles, self._genres, {"": self._defaults}):
+            for layers in group.values():
+                for layer, words in layers.items():
+                    for word in words:
+                        self._keyword_layer.setdefault(word.lower(), layer)
+        for genre in self._genres:
+            self._keyword_layer.setdefault(genre, "mood")
+        for word in directive.keywords.get("quality", ()) + directive.keywords.get("medium", ()):
+            self._keyword_layer.setdefault(word, "technical")
+        self._layer_order = sorted(
+            (layer for layer in LAYER_WEIGHTS if layer != "subject"), key=lambda l: -LAYER_WEIGHTS[l]
+        )
+
+    @property
+    def styles(self) -> List[str]:
+        return sorted(self._styles)
+
+    @property
+    def genres(self) -> List[str]:
+        return sorted(self._genres)
+
+    def enhance(self, prompt: str, model: Optional[str] = None, target: Optional[str] = None,
+                style: Optional[str] = None, genre: Optional[str] = None) -> EnhancedPrompt:
+        if not _WORD_RE.search(prompt):
+            raise ValueError("prompt has no words to enhance")
+        target = target or target_for_model(model)
+        key = (" ".join(prompt.split()), target, _uses_break(model),
+               (style or "").lower(), (genre or "").lower())
+        cached = self._memo.get(key)
+        if cached is not None:
+            self.hits += 1
+            self._memo.move_to_end(key)
+            return cached
+
+        self.misses += 1
+        if target == VIDEO:
+            result = self._enhance_video(key[0], key[3], key[4])
+        else:
+            result = self._enhance_image(key[0], key[2], key[3], key[4])
+        self._memo[key] = result
+        if len(self._memo) > self.cache_size:
+            self._memo.popitem(last=False)
+        return result
+
+    def _layers(self, style: str, genre: str) -> Dict[str, List[str]]:
+        layers: Dict[str, List[str]] = {layer: [] for layer in self._layer_order}
+        if style:
+            preset = self._styles.get(style, {})
+            if not any(style in word for word in preset.get("style", ())):
+                layers["style"].append(style)
+            for layer, words in preset.items():
+                layers[layer].extend(words)
+        if genre:
+            # As in promptGuide.ts, the genre itself is a mood keyword.
+            layers["mood"].append(genre)
+        for layer, words in self._genres.get(genre, {}).items():
+            layers[layer].extend(words)
+        for layer, words in self._defaults.items():
+            if not layers[layer]:
+                layers[layer].extend(words)
+        return layers
+
+    def _enhance_image(self, prompt: str, use_break: bool, style: str, genre: str) -> EnhancedPrompt:
+        directive = self.directive
+        subject = _split_phrases(prompt)
+        present = {p.lower() for p in subject}
+        covered = {self._keyword_layer[p] for p in present if p in self._keyword_layer}
+
+        budget = max(directive.image_elements[1] - len(subject), 0)
+        groups: List[Tuple[str, Tuple[str, ...]]] = [("subject", tuple(subject))]
+        for layer, words in self._layers(style, genre).items():
+            if layer in covered and layer != "style":
+                continue
+            picked = []
+            for word in words:
+                if budget == 0 or len(picked) >= directive.group_limits.get(layer, 3):
+                    break
+                if word.lower() not in present:
+                    present.add(word.lower())
+                    picked.append(word)
+                    budget -= 1
+            if picked:
+                groups.append((layer, tuple(picked)))
+
+        separator = " BREAK " if use_break else ", "
+        text = self._join(groups, separator)
+        # Trim the lightest keywords until every chunk fits the token window.
+        while len(groups) > 1 and any(
+            count_tokens(chunk) > directive.chunk_tokens for chunk in self._chunks(groups, use_break)
+        ):
+            layer, words = groups[-1]
+            groups[-1] = (layer, words[:-1])
+            if not groups[-1][1]:
+                groups.pop()
+            text = self._join(groups, separator)
+        return EnhancedPrompt(text, IMAGE, tuple(groups), count_tokens(text))
+
+    @staticmethod
+    def _join(groups: List[Tuple[str, Tuple[str, ...]]], separator: str) -> str:
+        return separator.join(", ".join(words) for _, words in groups)
+
+    @staticmethod
+    def _chunks(groups: List[Tuple[str, Tuple[str, ...]]], use_break: bool) -> List[str]:
+        joined = [", ".join(words) for _, words in groups]
+        return joined if use_break else [", ".join(joined)]
+
+    def _enhance_video(self, prompt: str, style: str, genre: str) -> EnhancedPrompt:
+        directive = self.directive
+        min_sentences, max_sentences = directive.video_sentences
+        min_words, max_words = directive.video_words
+        layers = self._layers(style, genre)
+        lower = prompt.lower()
+
+        # Stable choices per prompt so repeated requests match.
+        digest = int(hashlib.md5(prompt.encode()).hexdigest(), 16)
+
+        # [kind, text without its final punctuation, final punctuation]
+        subject = [s.strip() for s in _SENTENCE_RE.split(prompt) if s.strip()]
+        subject = [s if s[-1] in ".!?" else s + "." for s in subject]
+        # Leave room for the closing atmosphere sentence: fold the surplus
+        # into the last sentence kept rather than dropping the user's words.
+        keep = max(max_sentences - 1, 1)
+        if len(subject) > keep:
+            subject[keep - 1:] = ["; ".join(s[:-1] for s in subject[keep - 1:]) + subject[-1][-1]]
+        sentences = [["subject", s[:-1], s[-1]] for s in subject]
+
+        groups: List[Tuple[str, Tuple[str, ...]]] = [("subject", tuple(subject))]
+        if not any(re.search(rf"\b{term}\b", lower) for term in CAMERA_TERMS):
+            shot = CAMERA_SHOTS[digest % len(CAMERA_SHOTS)]
+            first = sentences[0][1]
+            sentences[0][:2] = ["camera", f"A {shot} captures {first[0].lower()}{first[1:]}"]
+            groups.append(("camera", (shot,)))
+
+        lighting = layers["lighting"][0]
+        # The genre name reads badly as an adjective; prefer its mood words.
+        moods = [word for word in layers["mood"] if word != genre] or layers["mood"]
+        mood = " and ".join(moods[:2])
+        article = "an" if mood[0].lower() in "aeiou" else "a"
+        closing = ["atmosphere", f"{lighting[0].upper()}{lighting[1:]} creates {article} {mood} atmosphere", "."]
+        extras = []
+        if layers["style"]:
+            extras.append((["detail", f"The scene is rendered in {layers['style'][0]}", "."],
+                           ("style", (layers["style"][0],))))
+        for offset in range(len(SCENE_DETAILS)):
+            detail = SCENE_DETAILS[(digest + offset) % len(SCENE_DETAILS)]
+            extras.append((["detail", detail[:-1], "."], None))
+
+        def words(parts: List[List[str]]) -> int:
+            return sum(len(part[1].split()) for part in parts)
+
+        # Add sentences while the directive allows more, and always up to its
+        # minimum count; past that, only if they fit the word limit.
+        for sentence, group in extras:
+            count = len(sentences) + 2
+            if count > max_sentences:
+                break
+            if count > min_sentences and words(sentences + [sentence, closing]) > max_words:
+                break
+            sentences.append(sentence)
+            if group:
+                groups.append(group)
+        sentences.append(closing)
+        groups.append(("atmosphere", (lighting,) + tuple(moods[:2])))
+
+        # Lengthen generated sentences, in turn, until the word target is met.
+        pools = {kind: list(clauses[digest % len(clauses):] + clauses[:digest % len(clauses)])
+                 for kind, clauses in ELABORATIONS.items()}
+        total = words(sentences)
+        while total < min_words:
+            grown = False
+            for sentence in sentences:
+                pool = pools.get(sentence[0])
+                if not pool or total >= min_words:
+                    continue
+                clause = pool.pop(0)
+                if total + len(clause.split()) <= max_words:
+                    sentence[1] += ", " + clause
+                    total += len(clause.split())
+                    grown = True
+            if not grown:
+                break
+
+        text = " ".join(body + end for _, body, end in sentences)
+        text = text[0].upper() + text[1:]
+        return EnhancedPrompt(text, VIDEO, tuple(groups), count_tokens(text))
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._memo)}
+
+
+class LLMError(Exception):
+    """The LLM provider failed or could not be reached."""
+
+
+class LLMEnhancer:
+    """Opt-in enhancement through OpenAI using the full directive as the
+    system prompt. The SDK is imported on first use only; its errors are
+    raised as ``LLMError``."""
+
+    def __init__(self, directive_text: str):
+        self.directive_text = directive_text
+
+    def _get_client(self):
+        return get_provider("openai")
+
+    async def enhance(self, prompt: str, target: str, style: Optional[str] = None,
+                      genre: Optional[str] = None) -> EnhancedPrompt:
+        context = "\n".join(
+            line for line in (
+                f"Target: {'Luma Dream Machine video' if target == VIDEO else 'Flux/Stable Diffusion image'}",
+                f"Style: {style}" if style else "",
+                f"Genre: {genre}" if genre else "",
+            ) if line
+        )
+        client = self._get_client()
+        from openai import APIError
+
+        try:
+            completion = await client.chat.completions.create(
+                model=get_settings().openai_prompt_model,
+                messages=[
+                    {"role": "system", "content": self.directive_text},
+                    {"role": "user", "content": f"{context}\n\nEnhance this prompt. Reply with the enhanced prompt only.\n\n{prompt}"},
+                ],
+                max_tokens=300,
+                temperature=0.7,
+            )
+        except APIError as exc:
+            raise LLMError(str(exc)) from exc
+        text = (completion.choices[0].message.content or "").strip().strip('"')
+        return EnhancedPrompt(text, target, (), count_tokens(text), source="llm")
+
+
+def _directive_path() -> Path:
+    configured = get_settings().prompt_directive_path
+    if configured:
+        return Path(configured)
+    return Path(__file__).resolve().parents[3] / "prompt_dir.txt"
+
+
+def _presets_path() -> Path:
+    configured = get_settings().prompt_presets_path
+    if configured:
+        return Path(configured)
+    return Path(__file__).resolve().parents[3] / "frontend" / "constants" / "promptPresets.json"
+
+
+def _load_presets() -> Presets:
+    path = _presets_path()
+    try:
+        return parse_presets(json.loads(path.read_text()))
+    except (OSError, ValueError) as exc:
+        logger.warning("Prompt presets %s not loaded (%s), using no style or genre presets", path, exc)
+        return Presets()
+
+
+def _directive_text() -> str:
+    path = _directive_path()
+    try:
+        return path.read_text()
+    except OSError:
+        logger.warning("Prompt directive %s not found, using built-in defaults", path)
+        return ""
+
+
+@lru_cache
+def get_prompt_engine() -> PromptEngine:
+    text = _directive_text()
+    directive = parse_directive(text) if text else Directive()
+    return PromptEngine(directive, _load_presets(), cache_size=get_settings().prompt_cache_size)
+
+
+@lru_cache
+def get_llm_enhancer() -> LLMEnhancer:
+    return LLMEnhancer(_directive_text())
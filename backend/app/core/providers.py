@@ -0,0 +1,86 @@
+"""Lazily constructed provider clients.
+
+Provider modules and SDKs are imported the first time a client is asked
+for, not when the app is built, so a cold start only pays for the
+providers a request actually touches. Each client is built once per
+process and reused.
+"""
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+from app.core.config import get_settings
+from app.core.http import get_http_client
+
+logger = logging.getLogger(__name__)
+
+Factory = Callable[[], Any]
+Warmer = Callable[[Any], Awaitable[None]]
+
+_factories: Dict[str, Factory] = {}
+_warmers: Dict[str, Warmer] = {}
+_instances: Dict[str, Any] = {}
+
+
+def register(name: str, factory: Factory, warm: Optional[Warmer] = None) -> None:
+    _factories[name] = factory
+    if warm is not None:
+        _warmers[name] = warm
+    _instances.pop(name, None)
+
+
+def get_provider(name: str) -> Any:
+    """Return the client for ``name``, importing and building it on first use."""
+    client = _instances.get(name)
+    if client is None:
+        try:
+            factory = _factories[name]
+        except KeyError:
+            raise LookupError(f"Unknown provider {name!r}") from None
+        client = _instances[name] = factory()
+        logger.info("Loaded provider %s", name)
+    return client
+
+
+def loaded() -> Dict[str, bool]:
+    return {name: name in _instances for name in _factories}
+
+
+async def warm(names: Iterable[str]) -> None:
+    """Build the named clients and open their connection pools.
+
+    Failures are logged and otherwise ignored: warming is an optimisation
+    and must never keep the app from starting.
+    """
+    for name in names:
+        try:
+            client = get_provider(name)
+            warmer = _warmers.get(name)
+            if warmer is not None:
+                await warmer(client)
+            logger.info("Warmed provider %s", name)
+        except Exception:
+            logger.warning("Could not warm provider %s", name, exc_info=True)
+
+
+def _replicate() -> Any:
+    from app.routers.predictions.client import ReplicateClient
+
+    return ReplicateClient()
+
+
+async def _warm_replicate(client: Any) -> None:
+    await client.warm()
+
+
+def _openai() -> Any:
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(api_key=get_settings().openai_api_key, http_client=get_http_client())
+
+
+async def _warm_openai(client: Any) -> None:
+    await get_http_client().head(str(client.base_url))
+
+
+register("replicate", _replicate, _warm_replicate)
+register("openai", _openai, _warm_openai)
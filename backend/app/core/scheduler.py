@@ -0,0 +1,373 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.metrics import PROVIDER_IN_FLIGHT, PROVIDER_QUEUE, model_label
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITIES = {"interactive": INTERACTIVE, "batch": BATCH}
+
+
+@dataclass(frozen=True)
+class ProviderLimits:
+    # Upstream predictions allowed to run at once across all models.
+    concurrency: int = 32
+    # Upstream predictions allowed to run at once for a single model.
+    model_concurrency: int = 8
+    # Sustained create requests per second and bucket size for bursts.
+    rate: float = 5.0
+    burst: int = 10
+    # Callers with an admission timeout are turned away once this many
+    # requests are already waiting for the provider.
+    max_queue: int = 256
+
+
+# Kept below the documented account limits so bursts do not end in 429s.
+DEFAULT_LIMITS = {
+    "replicate": ProviderLimits(concurrency=32, model_concurrency=8, rate=8.0, burst=16),
+    "fal": ProviderLimits(concurrency=16, model_concurrency=8, rate=5.0, burst=10),
+    "luma": ProviderLimits(concurrency=4, model_concurrency=4, rate=1.0, burst=2),
+}
+
+
+class Overloaded(Exception):
+    """Work was turned away instead of queued. Answer with ``status_code``
+    and ``Retry-After: retry_after``."""
+
+    def __init__(self, detail: str, status_code: int, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        # The lock keeps callers in arrival order, so priority order chosen
+        # by the scheduler is preserved while waiting for tokens.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens, e.g. after the provider answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+
+@dataclass
+class _LaneStats:
+    dispatched: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+@dataclass
+class _Lane:
+    model: str
+    limit: int
+    active: int = 0
+    waiters: List[Tuple[int, int, float, asyncio.Future]] = field(default_factory=list)
+    stats: _LaneStats = field(default_factory=_LaneStats)
+
+
+class _Provider:
+    def __init__(self, name: str, limits: ProviderLimits):
+        self.name = name
+        self.limits = limits
+        self.bucket = TokenBucket(limits.rate, limits.burst)
+        self.active = 0
+        self.lanes: Dict[str, _Lane] = {}
+
+    def lane(self, model: str) -> _Lane:
+        lane = self.lanes.get(model)
+        if lane is None:
+            lane = self.lanes[model] = _Lane(model, self.limits.model_concurrency)
+        return lane
+
+    def queued(self) -> int:
+        return sum(len(lane.waiters) for lane in self.lanes.values())
+
+
+@dataclass
+class Slot:
+    provider: str
+    model: str
+    released: bool = False
+    timer: Optional[asyncio.TimerHandle] = None
+    # Called after the slot was released by its timeout, so the owner can
+    # find out what happened to the work it was holding the slot for.
+    on_expire: Optional[Callable[["Slot"], None]] = None
+
+
+class Scheduler:
+    """Admission control for upstream generation requests.
+
+    Work is grouped per provider and per model. A caller waits until both
+    the provider and its model have a free concurrency slot and the
+    provider's token bucket allows another request. Waiters are served by
+    priority (interactive before batch) and FIFO within a priority.
+
+    Slots are held for the whole life of the upstream prediction, not just
+    the create call, and are released by ``release`` (or automatically after
+    ``slot_timeout`` seconds in case a completion is never observed).
+
+    Lanes exist only while a model has work running or queued, so arbitrary
+    model names do not accumulate; per-model stats restart when a lane is
+    recreated.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimits]] = None,
+                 slot_timeout: float = 600.0):
+        self._limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self._providers: Dict[str, _Provider] = {}
+        self._seq = itertools.count()
+        self.slot_timeout = slot_timeout
+
+    def provider(self, name: str) -> _Provider:
+        provider = self._providers.get(name)
+        if provider is None:
+            limits = self._limits.get(name, ProviderLimits())
+            provider = self._providers[name] = _Provider(name, limits)
+        return provider
+
+    async def acquire(self, provider_name: str, model: str, priority: int = INTERACTIVE,
+                      timeout: Optional[float] = None) -> Slot:
+        """Wait for a concurrency slot and a rate-limit token.
+
+        ``timeout`` is for callers answering a client: they get ``Overloaded``
+        (429) right away when ``max_queue`` requests are already waiting, or
+        (503) when no slot frees up within ``timeout`` seconds. Background
+        callers leave it out and wait as long as it takes.
+        """
+        provider = self.provider(provider_name)
+        lane = provider.lane(model)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        heapq.heappush(lane.waiters, (priority, next(self._seq), enqueued, future))
+        self._dispatch(provider)
+        if timeout is not None and not future.done() and provider.queued() > provider.limits.max_queue:
+            self._drop_waiter(provider, lane, future)
+            raise Overloaded(f"Too many requests queued for {provider_name}", 429,
+                             self._retry_after(provider))
+
+        try:
+            done, _ = await asyncio.wait((future,), timeout=timeout)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted at the same moment the caller went away.
+                self._release(provider, lane)
+            else:
+                self._drop_waiter(provider, lane, future)
+            raise
+        if not done:
+            self._drop_waiter(provider, lane, future)
+            raise Overloaded(f"No {provider_name} capacity within {timeout:g}s", 503,
+                             self._retry_after(provider))
+
+        try:
+            await provider.bucket.acquire()
+        except BaseException:
+            self._release(provider, lane)
+            raise
+
+        slot = Slot(provider_name, model)
+
+        wait = time.monotonic() - enqueued
+        lane.stats.dispatched += 1
+        lane.stats.total_wait += wait
+        lane.stats.max_wait = max(lane.stats.max_wait, wait)
+        PROVIDER_QUEUE.observe(wait, provider=provider_name, model=model_label(model))
+        PROVIDER_IN_FLIGHT.inc(provider=provider_name)
+        if self.slot_timeout > 0:
+            slot.timer = asyncio.get_running_loop().call_later(self.slot_timeout, self._expire, slot)
+        return slot
+
+    def release(self, slot: Slot) -> None:
+        if slot.released:
+            return
+        slot.released = True
+        if slot.timer is not None:
+            slot.timer.cancel()
+        PROVIDER_IN_FLIGHT.dec(provider=slot.provider)
+        provider = self.provider(slot.provider)
+        self._release(provider, provider.lane(slot.model))
+
+    async def throttle(self, provider_name: str) -> None:
+        """Wait for a rate-limit token without taking a concurrency slot,
+        for retries made while already holding one."""
+        await self.provider(provider_name).bucket.acquire()
+
+    def penalize(self, provider_name: str, seconds: float) -> None:
+        """Back off a provider after it rate-limited us."""
+        logger.warning("Provider %s rate limited, pausing for %.1fs", provider_name, seconds)
+        self.provider(provider_name).bucket.pause(seconds)
+
+    def _expire(self, slot: Slot) -> None:
+        logger.warning("Releasing %s/%s slot after %.0fs without completion",
+                       slot.provider, slot.model, self.slot_timeout)
+        slot.timer = None
+        self.release(slot)
+        if slot.on_expire is not None:
+            try:
+                slot.on_expire(slot)
+            except Exception:
+                logger.exception("Slot expiry callback failed")
+
+    @staticmethod
+    def _retry_after(provider: _Provider) -> int:
+        # Time for the token bucket to let the current queue through.
+        return max(1, math.ceil((provider.queued() + 1) / provider.limits.rate))
+
+    @staticmethod
+    def _prune(provider: _Provider, lane: _Lane) -> None:
+        if lane.active == 0 and not lane.waiters:
+            provider.lanes.pop(lane.model, None)
+
+    def _release(self, provider: _Provider, lane: _Lane) -> None:
+        provider.active -= 1
+        lane.active -= 1
+        self._dispatch(provider)
+        self._prune(provider, lane)
+
+    def _drop_waiter(self, provider: _Provider, lane: _Lane, future: asyncio.Future) -> None:
+        future.cancel()
+        lane.waiters = [w for w in lane.waiters if w[3] is not future]
+        heapq.heapify(lane.waiters)
+        self._prune(provider, lane)
+
+    def _dispatch(self, provider: _Provider) -> None:
+        while provider.active < provider.limits.concurrency:
+            best: Optional[_Lane] = None
+            for lane in provider.lanes.values():
+                if lane.waiters and lane.active < lane.limit:
+                    if best is None or lane.waiters[0][:2] < best.waiters[0][:2]:
+                        best = lane
+            if best is None:
+                return
+            _, _, _, future = heapq.heappop(best.waiters)
+            if future.done():
+                self._prune(provider, best)
+                continue
+            provider.active += 1
+            best.active += 1
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        providers = {}
+        for name, provider in self._providers.items():
+            lanes = {}
+            for model, lane in provider.lanes.items():
+                stats = lane.stats
+                lanes[model] = {
+                    "active": lane.active,
+                    "queued": len(lane.waiters),
+                    "queued_by_priority": {
+                        label: sum(1 for w in lane.waiters if w[0] == value)
+                        for label, value in PRIORITIES.items()
+                    },
+                    "dispatched": stats.dispatched,
+                    "avg_wait": stats.total_wait / stats.dispatched if stats.dispatched else 0.0,
+                    "max_wait": stats.max_wait,
+                }
+            providers[name] = {
+                "active": provider.active,
+                "queued": sum(len(lane.waiters) for lane in provider.lanes.values()),
+                "limits": provider.limits.__dict__,
+                "models": lanes,
+            }
+        return providers
+
+
+class SingleFlight:
+    """Collapse identical in-flight requests onto one upstream call.
+
+    The first caller for a key runs ``factory``; callers arriving while it is
+    still running, or until ``forget`` is called for that key, receive the
+    same result.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return ``(result, shared)`` where ``shared`` is true for joiners."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(flight), True
+
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await factory()
+        except Exception as exc:
+            del self._flights[key]
+            flight.set_exception(exc)
+            # Mark it retrieved so asyncio does not warn when nobody joined.
+            flight.exception()
+            raise
+        except BaseException:
+            del self._flights[key]
+            flight.cancel()
+            raise
+        flight.set_result(result)
+        return result, False
+
+    def forget(self, key: str) -> None:
+        self._flights.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+
+def parse_limits(raw: Optional[str]) -> Dict[str, ProviderLimits]:
+    """Parse a JSON override such as ``{"replicate": {"rate": 10, "burst": 20}}``."""
+    if not raw:
+        return {}
+    overrides = {}
+    for name, values in json.loads(raw).items():
+        base = DEFAULT_LIMITS.get(name, ProviderLimits())
+        overrides[name] = ProviderLimits(**{**base.__dict__, **values})
+    return overrides
+
+
+@lru_cache
+def get_scheduler() -> Scheduler:
+    settings = get_settings()
+    return Scheduler(parse_limits(settings.provider_limits), slot_timeout=settings.scheduler_slot_timeout)
+
+
+@lru_cache
+def get_single_flight() -> SingleFlight:
+    return SingleFlight()
@@ -1,24 +1,75 @@
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 import logging
+from contextlib import asynccontextmanager
+
 from dotenv import load_dotenv
-import os
+from fastapi import FastAPI
+
+from app.core import providers
+from app.core.config import get_settings
+from app.core.http import close_http_client
+from app.core.logs import configure_logging
+from app.core.middleware import MetricsMiddleware
+from app.core.prompt_engine import get_prompt_engine
+from app.models.history import get_history_store
+from app.routers import assets, batches, history, metrics, predictions, prompts
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
 
-# Create FastAPI app
-app = FastAPI(
-    title="Medusa.io API",
-    description="Backend API for Medusa.io",
-    version="1.0.0"
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the prompt directive before the first request needs it.
+    get_prompt_engine()
+    # Provider clients load lazily unless asked to be ready up front.
+    await providers.warm(get_settings().warm_providers)
+    yield
+    await batches.get_batch_store().shutdown()
+    await get_history_store().close()
+    await close_http_client()
+    assets.shutdown_pool()
+
 
-# Health check endpoint
-@app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+def create_app() -> FastAPI:
+    """Build the API. Importing this module has no side effects; environment
+    loading, logging setup and app construction all happen here."""
+    load_dotenv()
+    settings = get_settings()
+    configure_logging(settings.log_level)
+    if not settings.replicate_webhook_secret:
+        if settings.replicate_webhook_allow_unsigned:
+            logger.warning("REPLICATE_WEBHOOK_ALLOW_UNSIGNED is set; prediction webhooks are not authenticated "
+                           "and results are confirmed upstream before they are cached")
+        else:
+            logger.warning("REPLICATE_WEBHOOK_SECRET is not set; prediction webhooks will be rejected "
+                           "(set REPLICATE_WEBHOOK_ALLOW_UNSIGNED=1 to accept them from a local fake)")
+
+    app = FastAPI(
+        title="Medusa.io API",
+        description="Backend API for Medusa.io",
+        version="1.0.0",
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(MetricsMiddleware, sample_rate=settings.monitoring_sample_rate)
+
+    app.include_router(metrics.router)
+    app.include_router(predictions.router)
+    app.include_router(batches.router)
+    app.include_router(prompts.router)
+    app.include_router(assets.router)
+    app.include_router(history.router)
+    app.add_api_route("/health", health_check, methods=["GET"])
+    return app
+
+
+def __getattr__(name: str):
+    # ``app.main:app`` keeps working for uvicorn and serverless entry points;
+    # the app is built the first time it is looked up, then cached.
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1 +1,3 @@
-
+from app.models.history import HistoryStore, get_history_store
+
+__all__ = ["HistoryStore", "get_history_store"]
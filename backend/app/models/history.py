@@ -0,0 +1,301 @@
+import asyncio
+import base64
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    model TEXT,
+    status TEXT NOT NULL,
+    prompt TEXT,
+    input TEXT,
+    output TEXT,
+    error TEXT,
+    batch_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions (user_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_predictions_model ON predictions (model, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_predictions_status ON predictions (status, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_predictions_batch ON predictions (batch_id, created_at DESC, id DESC);
+"""
+
+# Later webhooks carry no user/batch; keep what the create call recorded.
+UPSERT = """
+INSERT INTO predictions (id, user_id, model, status, prompt, input, output, error, batch_id,
+                         created_at, updated_at)
+VALUES (:id, :user_id, :model, :status, :prompt, :input, :output, :error, :batch_id,
+        :created_at, :updated_at)
+ON CONFLICT (id) DO UPDATE SET
+    user_id = COALESCE(excluded.user_id, predictions.user_id),
+    model = COALESCE(excluded.model, predictions.model),
+    status = excluded.status,
+    prompt = COALESCE(excluded.prompt, predictions.prompt),
+    input = COALESCE(excluded.input, predictions.input),
+    output = COALESCE(excluded.output, predictions.output),
+    error = COALESCE(excluded.error, predictions.error),
+    batch_id = COALESCE(excluded.batch_id, predictions.batch_id),
+    updated_at = excluded.updated_at
+"""
+
+COLUMNS = ("id", "user_id", "model", "status", "prompt", "input", "output", "error", "batch_id",
+           "created_at", "updated_at")
+FILTERS = ("user_id", "model", "status", "batch_id")
+MAX_PAGE_SIZE = 200
+
+
+def _timestamp(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+def _merge(previous: Optional[Dict[str, Any]], row: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold ``row`` over an earlier pending version of the same row."""
+    if previous is None:
+        return row
+    return {**previous, **{k: v for k, v in row.items() if v is not None},
+            "created_at": previous["created_at"]}
+
+
+def encode_cursor(created_at: float, prediction_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at!r}|{prediction_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    created_at, _, prediction_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+    return float(created_at), prediction_id
+
+
+class HistoryStore:
+    """Durable prediction history in SQLite (WAL mode).
+
+    ``record`` only buffers the row, coalescing repeated updates of the same
+    prediction; a background task writes buffered rows in one transaction
+    every ``flush_interval`` seconds or as soon as ``batch_size`` rows are
+    pending. A batch that fails to write goes back into the buffer for the
+    next flush. Reads use per-thread connections, which WAL lets run
+    alongside the writer; ``close`` closes them along with the writer.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.05, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.rows_written = 0
+        self.flushes = 0
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _open_writer(self) -> None:
+        if self._writer is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._writer = self._connect()
+            self._writer.executescript(SCHEMA)
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            with self._write_lock:
+                self._open_writer()
+                self._readers.append(conn)
+            self._local.conn = conn
+        return conn
+
+    # -- writes ------------------------------------------------------------
+
+    def record(self, prediction: Dict[str, Any], user_id: Optional[str] = None,
+               batch_id: Optional[str] = None, shared: bool = False) -> None:
+        """Buffer the latest state of a prediction for the next flush.
+
+        ``shared`` rows are for requests answered by another request's
+        prediction (a cache hit or a joined identical request). They get
+        their own row, ``<prediction id>:<user id>:<batch id>``, dated when
+        first recorded, so the requester's history still shows them.
+        """
+        now = time.time()
+        input = prediction.get("input")
+        output = prediction.get("output")
+        row_id = prediction["id"]
+        if shared:
+            row_id = ":".join((row_id, user_id or "", batch_id or ""))
+        row = {
+            "id": row_id,
+            "user_id": user_id,
+            "model": prediction.get("model") or prediction.get("version"),
+            "status": prediction.get("status") or "starting",
+            "prompt": input.get("prompt") if isinstance(input, dict) else None,
+            "input": json.dumps(input) if input is not None else None,
+            "output": json.dumps(output) if output is not None else None,
+            "error": str(prediction["error"]) if prediction.get("error") else None,
+            "batch_id": batch_id,
+            "created_at": now if shared else _timestamp(prediction.get("created_at")),
+            "updated_at": now,
+        }
+        self._pending[row["id"]] = _merge(self._pending.get(row["id"]), row)
+
+        self._ensure_started()
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except sqlite3.Error:
+                logger.exception("Failed to write prediction history")
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        with self._write_lock:
+            self._open_writer()
+            with self._writer:
+                self._writer.executemany(UPSERT, rows)
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        rows = list(self._pending.values())
+        self._pending.clear()
+        try:
+            await asyncio.to_thread(self._write, rows)
+        except BaseException:
+            # Put the batch back under whatever was recorded meanwhile. If we
+            # were cancelled the write may still land; upserts are idempotent.
+            newer, self._pending = self._pending, {row["id"]: row for row in rows}
+            for row in newer.values():
+                self._pending[row["id"]] = _merge(self._pending.get(row["id"]), row)
+            raise
+        self.rows_written += len(rows)
+        self.flushes += 1
+
+    def _close_connections(self) -> None:
+        # Under the lock, so a write still running in a worker thread finishes first.
+        with self._write_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._local = threading.local()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self._close_connections)
+
+    # -- reads -------------------------------------------------------------
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        item = dict(row)
+        item["prediction_id"] = item["id"].split(":", 1)[0]
+        for column in ("input", "output"):
+            if item[column] is not None:
+                item[column] = json.loads(item[column])
+        return item
+
+    def _get(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        row = self._reader().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM predictions WHERE id = ?", (prediction_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def _page(self, filters: Dict[str, Optional[str]], limit: int,
+              cursor: Optional[Tuple[float, str]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        clauses, params = [], []
+        for column in FILTERS:
+            value = filters.get(column)
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if cursor is not None:
+            # Keyset pagination: seek past the last row seen instead of OFFSET,
+            # so every page is an index range scan regardless of depth.
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._reader().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM predictions {where} "
+            "ORDER BY created_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+
+        items = [self._to_dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return items, next_cursor
+
+    async def get(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, prediction_id)
+
+    async def page(self, limit: int = 50, cursor: Optional[str] = None,
+                   **filters: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of history, newest first, plus the cursor for the next page."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        decoded = decode_cursor(cursor) if cursor else None
+        return await asyncio.to_thread(self._page, filters, limit, decoded)
+
+
+@lru_cache
+def get_history_store() -> HistoryStore:
+    settings = get_settings()
+    return HistoryStore(
+        settings.history_db_path,
+        flush_interval=settings.history_flush_interval,
+        batch_size=settings.history_batch_size,
+    )
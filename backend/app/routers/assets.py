@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from email.utils import formatdate
+from functools import partial
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Literal, Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import get_settings
+from app.core.images import IMAGE_EXTENSIONS, make_derivative, snap_width
+from app.core.scheduler import SingleFlight
+
+router = APIRouter(prefix="/assets", tags=["assets"])
+
+CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_derivative_slots: Optional[asyncio.Semaphore] = None
+_derivative_flights = SingleFlight()
+
+
+async def _until_disconnect(receive: Receive, respond: Callable[[], Awaitable[None]]) -> None:
+    """Run ``respond`` until it finishes or the client disconnects, so an
+    abandoned download stops reading the file instead of draining it."""
+    async with anyio.create_task_group() as task_group:
+        async def run() -> None:
+            await respond()
+            task_group.cancel_scope.cancel()
+
+        task_group.start_soon(run)
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        task_group.cancel_scope.cancel()
+
+
+class WholeFileResponse(FileResponse):
+    """Starlette's ``FileResponse`` for full-file 200s, stopped on disconnect."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await _until_disconnect(receive, partial(super().__call__, scope, receive, send))
+
+
+class RangeResponse(Response):
+    """Streams ``length`` bytes of a file starting at ``offset`` in chunked
+    reads, for 206 responses."""
+
+    def __init__(self, path: str, offset: int, length: int, headers: Dict[str, str], media_type: str):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.headers["content-length"] = str(length)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await _until_disconnect(receive, partial(self._send_body, send))
+
+    async def _send_body(self, send: Send) -> None:
+        remaining = self.length
+        async with await anyio.open_file(self.path, "rb") as file:
+            await file.seek(self.offset)
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File shrank underneath us; close the body rather than hang.
+            await send({"type": "http.response.body", "body": b""})
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _derivative_slots
+    if _pool is None:
+        settings = get_settings()
+        _pool = ProcessPoolExecutor(max_workers=settings.derivative_workers)
+        _derivative_slots = asyncio.Semaphore(settings.derivative_concurrency)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool, _derivative_slots
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    _pool = None
+    _derivative_slots = None
+
+
+def _resolve(filepath: str) -> Path:
+    root = Path(get_settings().assets_dir).resolve()
+    path = (root / filepath).resolve()
+    if root not in path.parents:
+        raise HTTPException(status_code=404, detail="File not found")
+    return path
+
+
+def _stat(path: Path) -> Optional[os.stat_result]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st if path.is_file() else None
+
+
+def _etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+async def _derivative(source: Path, st: os.stat_result, width: int, fmt: str
+                      ) -> Tuple[Path, os.stat_result]:
+    """Return the cached derivative, generating it in the process pool on a miss."""
+    digest = hashlib.sha1(f"{source}:{st.st_mtime_ns}:{st.st_size}:{width}:{fmt}".encode()).hexdigest()
+    destination = Path(get_settings().derivatives_dir) / digest[:2] / f"{digest}.{fmt}"
+    cached = await anyio.to_thread.run_sync(_stat, destination)
+    if cached is not None:
+        return destination, cached
+
+    async def generate() -> os.stat_result:
+        pool = _get_pool()
+        await anyio.to_thread.run_sync(lambda: destination.parent.mkdir(parents=True, exist_ok=True))
+        async with _derivative_slots:
+            await asyncio.get_running_loop().run_in_executor(
+                pool, make_derivative, str(source), str(destination), width, fmt
+            )
+        return await anyio.to_thread.run_sync(destination.stat)
+
+    try:
+        generated, _ = await _derivative_flights.do(digest, generate)
+    except ImportError:
+        raise HTTPException(status_code=501, detail="Image derivatives need Pillow installed")
+    except OSError:
+        raise HTTPException(status_code=415, detail="Unsupported image")
+    finally:
+        _derivative_flights.forget(digest)
+    return destination, generated
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into ``(start, end)`` inclusive.
+
+    Returns ``None`` for syntax we do not handle (e.g. multiple ranges), in
+    which case the whole file is sent. Raises 416 for unsatisfiable ranges.
+    """
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _file_response(request: Request, path: Path, st: os.stat_result, media_type: str,
+                   cache_control: str) -> Response:
+    etag = _etag(st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, st.st_size)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+            return RangeResponse(str(path), start, end - start + 1, headers, media_type)
+
+    return WholeFileResponse(path, headers=headers, media_type=media_type, stat_result=st)
+
+
+async def serve_file(request: Request, path: Path, cache_control: str) -> Response:
+    """Serve a file from disk with the same validators and range support as
+    ``/assets``; 404 if it does not exist."""
+    st = await anyio.to_thread.run_sync(_stat, path)
+    if st is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return _file_response(request, path, st, media_type, cache_control)
+
+
+@router.api_route("/{filepath:path}", methods=["GET", "HEAD"])
+async def get_asset(
+    filepath: str,
+    request: Request,
+    w: Optional[int] = None,
+    format: Optional[Literal["webp", "jpeg", "png"]] = None,
+):
+    """Serve an uploaded file, or a resized/re-encoded derivative of an image
+    when ``w`` and/or ``format`` are given."""
+    path = _resolve(filepath)
+    st = await anyio.to_thread.run_sync(_stat, path)
+    if st is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    settings = get_settings()
+    cache_control = f"public, max-age={settings.assets_max_age}"
+    if w is not None or format is not None:
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=415, detail="Derivatives are only available for images")
+        fmt = format or "webp"
+        path, st = await _derivative(path, st, snap_width(w) if w else 0, fmt)
+        media_type = f"image/{fmt}"
+        # Derivative URLs change with their inputs only, so they can be cached hard.
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+    return _file_response(request, path, st, media_type, cache_control)
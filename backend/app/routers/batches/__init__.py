@@ -0,0 +1,4 @@
+from app.routers.batches.jobs import BatchJob, BatchStore, get_batch_store
+from app.routers.batches.router import router
+
+__all__ = ["BatchJob", "BatchStore", "get_batch_store", "router"]
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.cache import get_result_cache
+from app.core.config import get_settings
+from app.core.scheduler import get_scheduler, get_single_flight
+from app.routers.batches.schemas import BatchCreate
+from app.routers.predictions import service
+from app.routers.predictions.client import ReplicateError
+from app.routers.predictions.schemas import PredictionCreate
+from app.routers.predictions.store import is_terminal
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"completed", "canceled"}
+
+
+class BatchJob:
+    """A set of predictions run through a bounded worker pool.
+
+    Results are appended in completion order; the position of a result in
+    ``results`` is its sequence number, which clients use to resume a stream.
+    """
+
+    def __init__(self, items: List[PredictionCreate], concurrency: int):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.concurrency = min(concurrency, len(items))
+        self.status = "running"
+        self.results: List[Dict[str, Any]] = []
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        # Item index -> upstream prediction id, while the item is running.
+        self._predictions: Dict[int, str] = {}
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def summary(self) -> Dict[str, Any]:
+        succeeded = sum(1 for r in self.results if r["status"] == "succeeded")
+        canceled = sum(1 for r in self.results if r["status"] == "canceled")
+        failed = len(self.results) - succeeded - canceled
+        if self.status == "canceled":
+            # Items that never got a result were canceled with the batch.
+            canceled += len(self.items) - len(self.results)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "total": len(self.items),
+            "finished": len(self.results),
+            "succeeded": succeeded,
+            "failed": failed,
+            "canceled": canceled,
+            "concurrency": self.concurrency,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    async def _notify(self) -> None:
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _publish(self, result: Dict[str, Any]) -> None:
+        self.results.append(result)
+        await self._notify()
+
+    async def _finish(self, status: str) -> None:
+        if self.done:
+            return
+        self.status = status
+        self.finished_at = time.time()
+        await self._notify()
+
+    async def follow(self, after: int = -1, keepalive: Optional[float] = None
+                     ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """Yield ``{"seq", ...result}`` for every result after ``after``,
+        live, until the job is finished. Yields ``None`` every ``keepalive``
+        seconds without news so callers can send heartbeats."""
+        cursor = after + 1
+        while True:
+            while cursor < len(self.results):
+                yield {"seq": cursor, **self.results[cursor]}
+                cursor += 1
+            if self.done:
+                return
+            idle = False
+            async with self._changed:
+                if cursor < len(self.results) or self.done:
+                    continue
+                try:
+                    await asyncio.wait_for(self._changed.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    idle = True
+            # Yield only after releasing the condition: a slow consumer
+            # holding it would block every worker's _notify().
+            if idle:
+                yield None
+
+    async def cancel(self) -> None:
+        """Stop the workers and cancel the items' predictions upstream, except
+        those that also serve requests from outside this batch."""
+        if self.done:
+            return
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        running, self._predictions = set(self._predictions.values()), {}
+        for prediction_id in running:
+            try:
+                await service.cancel_for_batch(prediction_id, self.id)
+            except ReplicateError as exc:
+                logger.warning("Could not cancel %s of batch %s: %s", prediction_id, self.id, exc)
+        await self._finish("canceled")
+
+
+async def _run_item(job: BatchJob, index: int, body: PredictionCreate) -> Dict[str, Any]:
+    store = service.get_store()
+    result: Dict[str, Any] = {"index": index, "model": body.model, "input": body.input}
+    try:
+        prediction = await service.create_prediction(
+            body, store, service.get_client(), get_result_cache(), get_scheduler(), get_single_flight(),
+            batch_id=job.id,
+        )
+        if not is_terminal(prediction):
+            job._predictions[index] = prediction["id"]
+            prediction = await service.wait_for_prediction(
+                prediction["id"], store, get_settings().batch_item_timeout
+            )
+    except ReplicateError as exc:
+        return {**result, "status": "failed", "error": str(exc)}
+    except asyncio.TimeoutError:
+        return {**result, "status": "failed", "error": "Timed out waiting for prediction"}
+    finally:
+        job._predictions.pop(index, None)
+
+    return {
+        **result,
+        "status": prediction.get("status"),
+        "prediction_id": prediction["id"],
+        "output": prediction.get("output"),
+        "error": prediction.get("error"),
+        "cached": bool(prediction.get("cached")),
+    }
+
+
+async def _run(job: BatchJob) -> None:
+    pending: asyncio.Queue = asyncio.Queue()
+    for index, item in enumerate(job.items):
+        pending.put_nowait((index, item))
+
+    async def worker() -> None:
+        while True:
+            try:
+                index, item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await _run_item(job, index, item)
+            except Exception as exc:
+                logger.exception("Batch %s item %d failed", job.id, index)
+                result = {"index": index, "status": "failed", "error": str(exc)}
+            await job._publish(result)
+
+    await asyncio.gather(*(worker() for _ in range(job.concurrency)))
+    await job._finish("completed")
+
+
+class BatchStore:
+    def __init__(self, max_finished: int = 200):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, BatchJob]" = OrderedDict()
+
+    def get(self, job_id: str) -> Optional[BatchJob]:
+        return self._jobs.get(job_id)
+
+    def start(self, body: BatchCreate) -> BatchJob:
+        settings = get_settings()
+        items = []
+        for item in body.items:
+            model = item.model or body.model
+            if not model:
+                raise ValueError("Every item needs a model (per item or batch-level)")
+            items.append(PredictionCreate(
+                model=model,
+                input={**body.input, **item.input},
+                cache=body.cache,
+                priority="batch",
+                user_id=body.user_id,
+            ))
+        concurrency = min(body.concurrency or settings.batch_concurrency, settings.batch_max_concurrency)
+
+        job = BatchJob(items, concurrency)
+        job._task = asyncio.get_running_loop().create_task(_run(job))
+        self._jobs[job.id] = job
+        self._evict()
+        return job
+
+    def _evict(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    async def shutdown(self) -> None:
+        for job in list(self._jobs.values()):
+            await job.cancel()
+
+
+@lru_cache
+def get_batch_store() -> BatchStore:
+    return BatchStore(max_finished=get_settings().batch_store_size)
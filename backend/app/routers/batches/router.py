@@ -0,0 +1,95 @@
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+from app.routers.batches.jobs import BatchJob, BatchStore, get_batch_store
+from app.routers.batches.schemas import BatchCreate
+
+router = APIRouter(prefix="/batches", tags=["batches"])
+
+# Seconds between keep-alives while no item finishes.
+STREAM_KEEPALIVE = 15.0
+
+
+def _get_job(job_id: str, batches: BatchStore) -> BatchJob:
+    job = batches.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+
+@router.post("", status_code=202)
+async def create_batch(body: BatchCreate, batches: BatchStore = Depends(get_batch_store)):
+    max_items = get_settings().batch_max_items
+    if len(body.items) > max_items:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {max_items} items")
+    try:
+        job = batches.start(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    return job.summary()
+
+
+@router.get("/{job_id}")
+async def get_batch(job_id: str, batches: BatchStore = Depends(get_batch_store)):
+    return _get_job(job_id, batches).summary()
+
+
+@router.get("/{job_id}/events")
+async def stream_batch_events(
+    job_id: str,
+    after: int = -1,
+    last_event_id: Optional[str] = Header(None),
+    batches: BatchStore = Depends(get_batch_store),
+):
+    """Server-sent events, one ``result`` event per finished item and a final
+    ``done`` event. Reconnecting with ``Last-Event-ID`` (or ``?after=<seq>``)
+    resumes after the last result received."""
+    job = _get_job(job_id, batches)
+    if last_event_id is not None and last_event_id.lstrip("-").isdigit():
+        after = max(after, int(last_event_id))
+
+    async def events() -> AsyncIterator[str]:
+        async for result in job.follow(after, STREAM_KEEPALIVE):
+            if result is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"id: {result['seq']}\nevent: result\ndata: {json.dumps(result)}\n\n"
+        yield f"event: done\ndata: {json.dumps(job.summary())}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}/results")
+async def stream_batch_results(
+    job_id: str,
+    after: int = -1,
+    batches: BatchStore = Depends(get_batch_store),
+):
+    """Newline-delimited JSON: ``{"type": "result", "seq": ...}`` per finished
+    item, then one ``{"type": "done", "job": ...}`` line."""
+    job = _get_job(job_id, batches)
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in job.follow(after, STREAM_KEEPALIVE):
+            if result is None:
+                yield "\n"
+                continue
+            yield json.dumps({"type": "result", **result}) + "\n"
+        yield json.dumps({"type": "done", "job": job.summary()}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.delete("/{job_id}")
+async def cancel_batch(job_id: str, batches: BatchStore = Depends(get_batch_store)):
+    job = _get_job(job_id, batches)
+    await job.cancel()
+    return job.summary()
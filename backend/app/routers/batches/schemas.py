@@ -0,0 +1,20 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BatchItem(BaseModel):
+    # Falls back to the batch-level model when omitted.
+    model: Optional[str] = None
+    # Merged over the batch-level input.
+    input: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchCreate(BaseModel):
+    model: Optional[str] = None
+    input: Dict[str, Any] = Field(default_factory=dict)
+    items: List[BatchItem] = Field(..., min_length=1)
+    # Workers running at once for this job; capped by BATCH_MAX_CONCURRENCY.
+    concurrency: Optional[int] = Field(None, ge=1)
+    cache: bool = True
+    user_id: Optional[str] = None
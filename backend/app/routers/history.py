@@ -0,0 +1,37 @@
+import binascii
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from app.models.history import MAX_PAGE_SIZE, HistoryStore, get_history_store
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+
+@router.get("")
+async def list_history(
+    user_id: Optional[str] = None,
+    model: Optional[str] = None,
+    status: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    history: HistoryStore = Depends(get_history_store),
+):
+    """Newest-first generation history. Pass ``next_cursor`` from the
+    previous page as ``cursor`` to continue."""
+    try:
+        items, next_cursor = await history.page(
+            limit, cursor, user_id=user_id, model=model, status=status, batch_id=batch_id
+        )
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.get("/{prediction_id}")
+async def get_history_item(prediction_id: str, history: HistoryStore = Depends(get_history_store)):
+    item = await history.get(prediction_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Prediction not found")
+    return item
@@ -0,0 +1,12 @@
+from app.routers.predictions.client import ReplicateClient, ReplicateError
+from app.routers.predictions.router import get_client, get_store, router
+from app.routers.predictions.store import PredictionStore
+
+__all__ = [
+    "PredictionStore",
+    "ReplicateClient",
+    "ReplicateError",
+    "get_client",
+    "get_store",
+    "router",
+]
@@ -0,0 +1,106 @@
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from app.core.config import get_settings
+from app.core.http import get_http_client
+from app.core.metrics import PROVIDER_ERRORS, PROVIDER_REQUEST
+
+if TYPE_CHECKING:
+    import httpx
+
+DEFAULT_WEBHOOK_EVENTS = ["start", "output", "completed"]
+
+
+class ReplicateError(Exception):
+    def __init__(self, status_code: int, detail: Any, retry_after: Optional[float] = None):
+        super().__init__(f"Replicate API error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class ReplicateClient:
+    """Thin async wrapper over the Replicate HTTP API.
+
+    Uses the shared pooled client from ``app.core.http`` rather than the
+    ``replicate`` SDK so every call reuses the same keep-alive connections.
+    """
+
+    def __init__(self, http: Optional["httpx.AsyncClient"] = None,
+                 api_base: Optional[str] = None, api_token: Optional[str] = None):
+        settings = get_settings()
+        self._http = http
+        self.api_base = (api_base or settings.replicate_api_base).rstrip("/")
+        self.api_token = api_token if api_token is not None else settings.replicate_api_token
+
+    @property
+    def http(self) -> "httpx.AsyncClient":
+        return self._http or get_http_client()
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_token:
+            headers["Authorization"] = f"Bearer {self.api_token}"
+        return headers
+
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        http = self.http
+        start = time.perf_counter()
+        try:
+            response = await http.request(
+                method, f"{self.api_base}{path}", headers=self._headers(), **kwargs
+            )
+        except Exception:
+            PROVIDER_ERRORS.inc(provider="replicate", operation=operation, status="error")
+            raise
+        status = str(response.status_code)
+        PROVIDER_REQUEST.observe(time.perf_counter() - start, provider="replicate", operation=operation, status=status)
+        if response.status_code >= 400:
+            PROVIDER_ERRORS.inc(provider="replicate", operation=operation, status=status)
+            try:
+                detail = response.json()
+            except ValueError:
+                detail = response.text
+            retry_after = response.headers.get("retry-after")
+            raise ReplicateError(
+                response.status_code,
+                detail,
+                float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        return response.json()
+
+    async def warm(self) -> None:
+        """Open a pooled connection to the API so the first real call skips
+        DNS and the TLS handshake."""
+        await self.http.head(self.api_base, headers=self._headers())
+
+    async def create_prediction(
+        self,
+        model: str,
+        input: Dict[str, Any],
+        webhook: Optional[str] = None,
+        webhook_events_filter: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """Create a prediction for ``model``.
+
+        ``model`` is either ``owner/name`` (official model, latest version)
+        or ``owner/name:version`` / a bare version hash.
+        """
+        body: Dict[str, Any] = {"input": input}
+        if webhook:
+            body["webhook"] = webhook
+            body["webhook_events_filter"] = webhook_events_filter or DEFAULT_WEBHOOK_EVENTS
+
+        if ":" in model:
+            body["version"] = model.split(":", 1)[1]
+            return await self._request("create", "POST", "/predictions", json=body)
+        if "/" in model:
+            return await self._request("create", "POST", f"/models/{model}/predictions", json=body)
+        body["version"] = model
+        return await self._request("create", "POST", "/predictions", json=body)
+
+    async def get_prediction(self, prediction_id: str) -> Dict[str, Any]:
+        return await self._request("get", "GET", f"/predictions/{prediction_id}")
+
+    async def cancel_prediction(self, prediction_id: str) -> Dict[str, Any]:
+        return await self._request("cancel", "POST", f"/predictions/{prediction_id}/cancel")
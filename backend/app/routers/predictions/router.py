@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Any, AsyncIterator, Dict
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.core.cache import ResultCache, get_result_cache
+from app.core.config import get_settings
+from app.core.scheduler import Overloaded, Scheduler, SingleFlight, get_scheduler, get_single_flight
+from app.routers.assets import serve_file
+from app.routers.predictions import service
+from app.routers.predictions.client import ReplicateClient, ReplicateError
+from app.routers.predictions.schemas import PredictionCreate
+from app.routers.predictions.service import get_client, get_store
+from app.routers.predictions.store import PredictionStore, is_terminal
+from app.routers.predictions.webhooks import verify_signature
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/predictions", tags=["predictions"])
+
+# Seconds between SSE keep-alive comments while a prediction is idle.
+SSE_KEEPALIVE = 15.0
+_CACHE_KEY_RE = re.compile(r"^[0-9a-f]{64}$")
+_CACHE_FILE_RE = re.compile(r"^\d+(\.[A-Za-z0-9]+)?$")
+
+
+def _upstream_error(exc: ReplicateError) -> HTTPException:
+    status = exc.status_code if 400 <= exc.status_code < 500 else 502
+    return HTTPException(status_code=status, detail=exc.detail)
+
+
+async def _get_or_fetch(
+    prediction_id: str, store: PredictionStore, client: ReplicateClient
+) -> Dict[str, Any]:
+    try:
+        return await service.get_or_fetch(prediction_id, store, client)
+    except ReplicateError as exc:
+        raise _upstream_error(exc)
+
+
+@router.post("", status_code=201)
+async def create_prediction(
+    body: PredictionCreate,
+    request: Request,
+    store: PredictionStore = Depends(get_store),
+    client: ReplicateClient = Depends(get_client),
+    cache: ResultCache = Depends(get_result_cache),
+    scheduler: Scheduler = Depends(get_scheduler),
+    flights: SingleFlight = Depends(get_single_flight),
+):
+    try:
+        return await service.create_prediction(
+            body, store, client, cache, scheduler, flights,
+            admission_timeout=get_settings().scheduler_admission_timeout,
+            abandoned=request.is_disconnected,
+        )
+    except Overloaded as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc),
+                            headers={"Retry-After": str(exc.retry_after)})
+    except service.Abandoned:
+        # Nobody is listening; the status only shows up in metrics and logs.
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except ReplicateError as exc:
+        logger.error("Failed to create prediction: %s", exc)
+        raise _upstream_error(exc)
+
+
+@router.get("/cache/stats")
+async def cache_stats(cache: ResultCache = Depends(get_result_cache)):
+    return cache.snapshot()
+
+
+@router.get("/cache/files/{key}/{name}")
+async def cached_file(key: str, name: str, request: Request,
+                      cache: ResultCache = Depends(get_result_cache)):
+    """Output files kept with a cache entry (``CACHE_STORE_ASSETS``); cached
+    predictions link here instead of to expiring provider URLs."""
+    if not _CACHE_KEY_RE.match(key) or not _CACHE_FILE_RE.match(name):
+        raise HTTPException(status_code=404, detail="File not found")
+    return await serve_file(request, cache.asset_path(key, name), "public, max-age=86400")
+
+
+@router.get("/scheduler/stats")
+async def scheduler_stats(
+    scheduler: Scheduler = Depends(get_scheduler),
+    flights: SingleFlight = Depends(get_single_flight),
+):
+    return {
+        "providers": scheduler.snapshot(),
+        "in_flight": len(flights),
+        "coalesced": flights.coalesced,
+    }
+
+
+@router.post("/webhook")
+async def prediction_webhook(request: Request, store: PredictionStore = Depends(get_store)):
+    body = await request.body()
+    settings = get_settings()
+    if settings.replicate_webhook_secret:
+        if not verify_signature(settings.replicate_webhook_secret, request.headers, body):
+            raise HTTPException(status_code=401, detail="Invalid webhook signature")
+    elif not settings.replicate_webhook_allow_unsigned:
+        # Coalesced predictions are shared between users, so a forged result
+        # would reach everyone joined onto it.
+        raise HTTPException(status_code=401, detail="Unsigned webhooks are not accepted")
+
+    try:
+        prediction = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(prediction, dict) or "id" not in prediction:
+        raise HTTPException(status_code=400, detail="Missing prediction id")
+    if store.get(prediction["id"]) is None:
+        # Not one of ours (or from before a restart, in which case the next
+        # read fetches it upstream). Acknowledge so it is not retried.
+        logger.info("Ignoring webhook for unknown prediction %s", prediction["id"])
+        return {"ok": True, "ignored": True}
+
+    service.record(prediction, store)
+    return {"ok": True}
+
+
+@router.get("/{prediction_id}")
+async def get_prediction(
+    prediction_id: str,
+    store: PredictionStore = Depends(get_store),
+    client: ReplicateClient = Depends(get_client),
+):
+    return await _get_or_fetch(prediction_id, store, client)
+
+
+@router.get("/{prediction_id}/events")
+async def stream_prediction(
+    prediction_id: str,
+    request: Request,
+    store: PredictionStore = Depends(get_store),
+    client: ReplicateClient = Depends(get_client),
+):
+    """Server-sent events: one ``prediction`` event per state change, closing
+    after the prediction reaches a terminal status."""
+    await _get_or_fetch(prediction_id, store, client)
+
+    async def events() -> AsyncIterator[str]:
+        queue = store.subscribe(prediction_id)
+        try:
+            while True:
+                try:
+                    prediction = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: prediction\ndata: {json.dumps(prediction)}\n\n"
+                if is_terminal(prediction):
+                    return
+        finally:
+            store.unsubscribe(prediction_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/{prediction_id}/cancel")
+async def cancel_prediction(
+    prediction_id: str,
+    store: PredictionStore = Depends(get_store),
+    client: ReplicateClient = Depends(get_client),
+):
+    try:
+        prediction = await client.cancel_prediction(prediction_id)
+    except ReplicateError as exc:
+        raise _upstream_error(exc)
+    return service.record(prediction, store)
@@ -0,0 +1,15 @@
+from typing import Any, Dict, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+
+class PredictionCreate(BaseModel):
+    model: str = Field(..., description="owner/name, owner/name:version or a version hash")
+    input: Dict[str, Any] = Field(default_factory=dict)
+    # Set to false to skip the result cache and request coalescing and always
+    # run the model. Unseeded inputs are never cached or coalesced.
+    cache: bool = True
+    # Interactive requests are scheduled ahead of queued batch work.
+    priority: Literal["interactive", "batch"] = "interactive"
+    # Owner recorded in the generation history.
+    user_id: Optional[str] = None
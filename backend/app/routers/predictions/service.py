@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import PurePosixPath
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+from app.core.cache import ResultCache, cache_key, is_cacheable, is_pinned
+from app.core.config import get_settings
+from app.core.http import get_http_client
+from app.core.metrics import PREDICTION_TOTAL, model_label
+from app.core.providers import get_provider
+from app.core.scheduler import PRIORITIES, Scheduler, SingleFlight, Slot
+from app.models.history import get_history_store
+from app.routers.predictions.client import ReplicateClient, ReplicateError
+from app.routers.predictions.schemas import PredictionCreate
+from app.routers.predictions.store import PredictionStore, is_terminal
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/predictions/webhook"
+# Where output files kept by the result cache are served from.
+CACHE_FILES_PATH = "/predictions/cache/files"
+
+PROVIDER = "replicate"
+MAX_RATE_LIMIT_RETRIES = 3
+
+
+class Abandoned(Exception):
+    """The caller went away before its prediction was created upstream."""
+
+
+@dataclass
+class _Running:
+    """Bookkeeping for one of our upstream predictions until it finishes.
+
+    Keeps the instances that admitted it, so the slot, the coalescing key
+    and the cache fill go back to those and not to the process-wide ones.
+    """
+
+    scheduler: Scheduler
+    slot: Slot
+    client: ReplicateClient
+    store: PredictionStore
+    # Monotonic time the prediction was accepted, for end-to-end latency.
+    accepted_at: float
+    flights: Optional[SingleFlight] = None
+    flight_key: Optional[str] = None
+    cache: Optional[ResultCache] = None
+    cache_key: Optional[str] = None
+    # Lifetime cap for the cache entry; set when the model version is not pinned.
+    cache_ttl: Optional[float] = None
+    # Batch of the request that created it, if any.
+    batch_id: Optional[str] = None
+    # (user_id, batch_id) of identical requests joined onto this prediction.
+    sharers: Set[Tuple[Optional[str], Optional[str]]] = field(default_factory=set)
+
+
+_running: Dict[str, _Running] = {}
+_background_tasks: Set[asyncio.Task] = set()
+
+
+@lru_cache
+def get_store() -> PredictionStore:
+    return PredictionStore(max_size=get_settings().prediction_store_size)
+
+
+def get_client() -> ReplicateClient:
+    return get_provider(PROVIDER)
+
+
+def webhook_url() -> str:
+    return f"{get_settings().public_base_url}{WEBHOOK_PATH}"
+
+
+async def _download_assets(output: Any) -> List[Tuple[str, bytes, str]]:
+    """Fetch every output URL; returns ``(filename, bytes, url)`` per file."""
+    urls = output if isinstance(output, list) else [output]
+    assets = []
+    for index, url in enumerate(u for u in urls if isinstance(u, str) and u.startswith("http")):
+        response = await get_http_client().get(url)
+        response.raise_for_status()
+        assets.append((f"{index}{PurePosixPath(urlparse(url).path).suffix}", response.content, url))
+    return assets
+
+
+def cached_file_url(key: str, name: str) -> str:
+    return f"{get_settings().public_base_url}{CACHE_FILES_PATH}/{key}/{name}"
+
+
+def _rewrite_output(output: Any, urls: Dict[str, str]) -> Any:
+    if isinstance(output, str):
+        return urls.get(output, output)
+    if isinstance(output, list):
+        return [_rewrite_output(item, urls) for item in output]
+    return output
+
+
+async def _fill_cache(cache: ResultCache, key: str, prediction: Dict[str, Any],
+                      ttl: Optional[float] = None) -> None:
+    """Cache a succeeded prediction, for at most ``ttl`` seconds if given.
+
+    With ``CACHE_STORE_ASSETS`` the output files are kept next to the entry
+    and ``output`` is rewritten to point at this API, so hits stay valid
+    for the whole cache TTL. Otherwise the entry only lives as long as the
+    provider keeps its output URLs.
+    """
+    settings = get_settings()
+    url_ttl = settings.cache_url_ttl if ttl is None else min(ttl, settings.cache_url_ttl)
+    if settings.cache_store_assets:
+        try:
+            downloaded = await _download_assets(prediction.get("output"))
+        except Exception as exc:
+            logger.warning("Failed to download outputs of %s: %s", prediction["id"], exc)
+        else:
+            if downloaded:
+                urls = {url: cached_file_url(key, name) for name, _, url in downloaded}
+                value = {**prediction, "output": _rewrite_output(prediction.get("output"), urls)}
+                await cache.put(key, value, [(name, data) for name, data, _ in downloaded], ttl=ttl)
+                return
+    await cache.put(key, prediction, ttl=url_ttl)
+
+
+def _spawn(coro) -> None:
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _finish(running: _Running, prediction: Optional[Dict[str, Any]]) -> None:
+    """Release everything held for a prediction. ``prediction`` is its
+    terminal state, or ``None`` when we gave up waiting for one."""
+    running.scheduler.release(running.slot)
+    if running.flight_key is not None:
+        running.flights.forget(running.flight_key)
+    if prediction is None:
+        return
+    PREDICTION_TOTAL.observe(
+        time.monotonic() - running.accepted_at,
+        provider=PROVIDER,
+        model=model_label(prediction.get("model")),
+        status=prediction.get("status", ""),
+    )
+    if running.cache_key is not None and prediction.get("status") == "succeeded":
+        _spawn(_cache_result(running, prediction))
+
+
+async def _cache_result(running: _Running, prediction: Dict[str, Any]) -> None:
+    if not get_settings().replicate_webhook_secret:
+        # Unsigned webhooks can be forged; only cache what the provider confirms.
+        try:
+            prediction = await running.client.get_prediction(prediction["id"])
+        except Exception as exc:
+            logger.warning("Could not confirm %s before caching: %s", prediction["id"], exc)
+            return
+        if prediction.get("status") != "succeeded":
+            return
+    await _fill_cache(running.cache, running.cache_key, prediction, running.cache_ttl)
+
+
+async def _reconcile(prediction_id: str) -> None:
+    """The slot timed out without a terminal webhook (lost, or the webhook
+    URL is unreachable): look the prediction up once, then stop tracking
+    it either way so identical requests are no longer joined onto it."""
+    running = _running.get(prediction_id)
+    if running is None:
+        return
+    try:
+        record(await running.client.get_prediction(prediction_id), running.store)
+    except Exception as exc:
+        logger.warning("Failed to look up expired prediction %s: %s", prediction_id, exc)
+    finally:
+        running = _running.pop(prediction_id, None)
+        if running is not None:
+            _finish(running, None)
+
+
+def _record_shared(prediction: Dict[str, Any], user_id: Optional[str],
+                   batch_id: Optional[str]) -> None:
+    """History row for a request answered by another request's prediction."""
+    if user_id is not None or batch_id is not None:
+        get_history_store().record(prediction, user_id, batch_id, shared=True)
+
+
+def record(prediction: Dict[str, Any], store: PredictionStore, user_id: Optional[str] = None,
+           batch_id: Optional[str] = None) -> Dict[str, Any]:
+    """Store a prediction update, caching its result once it succeeds."""
+    merged = store.update(prediction)
+    get_history_store().record(merged, user_id, batch_id)
+    running = _running.get(merged["id"])
+    if running is not None:
+        for sharer in running.sharers:
+            _record_shared(merged, *sharer)
+    if is_terminal(merged):
+        running = _running.pop(merged["id"], None)
+        if running is not None:
+            _finish(running, merged)
+    return merged
+
+
+async def get_or_fetch(
+    prediction_id: str, store: PredictionStore, client: ReplicateClient
+) -> Dict[str, Any]:
+    """Serve from memory; only predictions we have never seen (e.g. created
+    before a restart) cost one upstream lookup, after which webhooks take over."""
+    prediction = store.get(prediction_id)
+    if prediction is not None:
+        return prediction
+    return record(await client.get_prediction(prediction_id), store)
+
+
+async def _submit(body: PredictionCreate, store: PredictionStore, scheduler: Scheduler,
+                  client: ReplicateClient, admission_timeout: Optional[float] = None,
+                  abandoned: Optional[Callable[[], Awaitable[bool]]] = None
+                  ) -> Tuple[Dict[str, Any], _Running]:
+    """Create the upstream prediction once the scheduler admits it.
+
+    The slot stays taken until the prediction reaches a terminal status.
+    ``abandoned`` is checked once admitted, so a caller that gave up while
+    queued does not start (and pay for) a prediction nobody will read.
+    """
+    accepted_at = time.monotonic()
+    slot = await scheduler.acquire(PROVIDER, body.model, PRIORITIES[body.priority], admission_timeout)
+    try:
+        if abandoned is not None and await abandoned():
+            raise Abandoned()
+        attempt = 0
+        while True:
+            try:
+                prediction = await client.create_prediction(body.model, body.input, webhook=webhook_url())
+                break
+            except ReplicateError as exc:
+                if exc.status_code != 429 or attempt >= MAX_RATE_LIMIT_RETRIES:
+                    raise
+                scheduler.penalize(PROVIDER, exc.retry_after or 2 ** attempt)
+                await scheduler.throttle(PROVIDER)
+                attempt += 1
+    except BaseException:
+        scheduler.release(slot)
+        raise
+    prediction_id = prediction["id"]
+    running = _running[prediction_id] = _Running(scheduler, slot, client, store, accepted_at)
+    slot.on_expire = lambda _: _spawn(_reconcile(prediction_id))
+    return prediction, running
+
+
+async def create_prediction(
+    body: PredictionCreate,
+    store: PredictionStore,
+    client: ReplicateClient,
+    cache: ResultCache,
+    scheduler: Scheduler,
+    flights: SingleFlight,
+    batch_id: Optional[str] = None,
+    admission_timeout: Optional[float] = None,
+    abandoned: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> Dict[str, Any]:
+    """Answer from the result cache, join an identical running prediction,
+    or schedule a new upstream one. Raises ``ReplicateError``, ``Overloaded``
+    when the scheduler turns the request away within ``admission_timeout``,
+    and ``Abandoned`` when ``abandoned()`` says the caller has gone.
+
+    Only cacheable (seeded, ``cache=True``) requests are served from the
+    cache or joined onto a running prediction; anything else is expected to
+    produce a fresh result and always runs the model.
+    """
+    cacheable = body.cache and is_cacheable(body.input)
+    if not cacheable:
+        prediction, running = await _submit(body, store, scheduler, client, admission_timeout, abandoned)
+        running.batch_id = batch_id
+        return record(prediction, store, body.user_id, batch_id)
+
+    key = cache_key(body.model, body.input)
+    cached = await cache.get(key)
+    if cached is not None:
+        hit = store.update({**cached, "cached": True})
+        _record_shared(hit, body.user_id, batch_id)
+        return hit
+
+    async def submit() -> Dict[str, Any]:
+        # No ``abandoned`` check: others may already have joined this flight.
+        prediction, running = await _submit(body, store, scheduler, client, admission_timeout)
+        running.flights, running.flight_key = flights, key
+        running.cache, running.cache_key = cache, key
+        # ``owner/name`` follows the latest version, which can change under
+        # the same key; such results are only reused for a bounded time.
+        if not is_pinned(body.model):
+            running.cache_ttl = get_settings().cache_unpinned_ttl
+        running.batch_id = batch_id
+        return record(prediction, store, body.user_id, batch_id)
+
+    prediction, shared = await flights.do(key, submit)
+    if shared:
+        # Identical request already running upstream; hand out its latest state
+        # and keep this requester's history row in step with it.
+        current = store.get(prediction["id"]) or prediction
+        _record_shared(current, body.user_id, batch_id)
+        running = _running.get(current["id"])
+        if running is not None:
+            running.sharers.add((body.user_id, batch_id))
+        return current
+    return prediction
+
+
+async def cancel_for_batch(prediction_id: str, batch_id: str) -> bool:
+    """Cancel a batch's prediction upstream, unless it has finished or also
+    serves a request from outside the batch (it was joined onto another
+    request's prediction, or another request joined onto it). Returns
+    whether it was cancelled; raises ``ReplicateError``."""
+    running = _running.get(prediction_id)
+    if running is None or running.batch_id != batch_id:
+        return False
+    if any(sharer_batch != batch_id for _, sharer_batch in running.sharers):
+        return False
+    record(await running.client.cancel_prediction(prediction_id), running.store)
+    return True
+
+
+async def wait_for_prediction(
+    prediction_id: str, store: PredictionStore, timeout: Optional[float] = None
+) -> Dict[str, Any]:
+    """Wait for webhook updates until the prediction reaches a terminal status."""
+    queue = store.subscribe(prediction_id)
+    try:
+        async def wait() -> Dict[str, Any]:
+            while True:
+                prediction = await queue.get()
+                if is_terminal(prediction):
+                    return prediction
+        return await asyncio.wait_for(wait(), timeout)
+    finally:
+        store.unsubscribe(prediction_id, queue)
@@ -0,0 +1,77 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+TERMINAL_STATUSES = {"succeeded", "failed", "canceled"}
+
+
+def is_terminal(prediction: Dict[str, Any]) -> bool:
+    return prediction.get("status") in TERMINAL_STATUSES
+
+
+class PredictionStore:
+    """In-memory prediction state with per-prediction update fan-out.
+
+    Webhooks call ``update``; every client that has ``subscribe``d to the
+    prediction gets the new state pushed to its queue. Waiting clients cost
+    nothing upstream.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._predictions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def __len__(self) -> int:
+        return len(self._predictions)
+
+    def get(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        return self._predictions.get(prediction_id)
+
+    def update(self, prediction: Dict[str, Any]) -> Dict[str, Any]:
+        """Merge ``prediction`` into the stored state and notify subscribers.
+
+        Replicate may deliver webhooks out of order, so an update never moves
+        a prediction from a terminal status back to a running one.
+        """
+        prediction_id = prediction["id"]
+        current = self._predictions.get(prediction_id)
+        if current is not None and is_terminal(current) and not is_terminal(prediction):
+            return current
+
+        merged = {**current, **prediction} if current else dict(prediction)
+        self._predictions[prediction_id] = merged
+        self._predictions.move_to_end(prediction_id)
+        self._evict()
+
+        for queue in self._subscribers.get(prediction_id, ()):
+            queue.put_nowait(merged)
+        return merged
+
+    def subscribe(self, prediction_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(prediction_id, set()).add(queue)
+        current = self._predictions.get(prediction_id)
+        if current is not None:
+            queue.put_nowait(current)
+        return queue
+
+    def unsubscribe(self, prediction_id: str, queue: asyncio.Queue) -> None:
+        subscribers = self._subscribers.get(prediction_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[prediction_id]
+
+    def _evict(self) -> None:
+        # Oldest first; predictions that are still running or have listeners
+        # are kept even when over capacity.
+        if len(self._predictions) <= self.max_size:
+            return
+        for prediction_id in list(self._predictions):
+            if len(self._predictions) <= self.max_size:
+                break
+            prediction = self._predictions[prediction_id]
+            if is_terminal(prediction) and prediction_id not in self._subscribers:
+                del self._predictions[prediction_id]
@@ -0,0 +1,33 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Mapping
+
+# Replicate signs webhooks following the Standard Webhooks spec.
+MAX_TIMESTAMP_SKEW = 5 * 60
+
+
+def sign(secret: str, webhook_id: str, timestamp: int, body: bytes) -> str:
+    """Build a ``webhook-signature`` header value for ``body``."""
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    signed = f"{webhook_id}.{timestamp}.".encode() + body
+    return "v1," + base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+
+
+def verify_signature(secret: str, headers: Mapping[str, str], body: bytes) -> bool:
+    webhook_id = headers.get("webhook-id")
+    timestamp = headers.get("webhook-timestamp")
+    signatures = headers.get("webhook-signature")
+    if not webhook_id or not timestamp or not signatures:
+        return False
+
+    try:
+        timestamp_value = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp_value) > MAX_TIMESTAMP_SKEW:
+        return False
+
+    expected = sign(secret, webhook_id, timestamp_value, body)
+    return any(hmac.compare_digest(candidate, expected) for candidate in signatures.split())
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import re
+from dataclasses import asdict
+from typing import Any, Dict, List, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field, field_validator
+
+from app.core.config import get_settings
+from app.core.prompt_engine import (
+    EnhancedPrompt,
+    LLMEnhancer,
+    LLMError,
+    PromptEngine,
+    get_llm_enhancer,
+    get_prompt_engine,
+    target_for_model,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/prompts", tags=["prompts"])
+
+MAX_BATCH = 500
+# LLM calls made at once for a single batch request.
+LLM_CONCURRENCY = 4
+
+
+class EnhanceRequest(BaseModel):
+    prompt: str = Field(..., min_length=1, max_length=2000)
+    model: Optional[str] = None
+    target: Optional[Literal["image", "video"]] = None
+    style: Optional[str] = None
+    genre: Optional[str] = None
+    # The local engine is used unless the caller explicitly asks for the LLM.
+    use_llm: bool = False
+
+    @field_validator("prompt", mode="before")
+    @classmethod
+    def _strip_prompt(cls, value):
+        # Checked after stripping so whitespace-only prompts fail min_length.
+        return value.strip() if isinstance(value, str) else value
+
+    @field_validator("prompt")
+    @classmethod
+    def _has_words(cls, value: str) -> str:
+        if not re.search(r"\w", value):
+            raise ValueError("prompt must contain at least one word")
+        return value
+
+
+class EnhanceBatchRequest(BaseModel):
+    items: List[EnhanceRequest] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+
+async def _enhance(body: EnhanceRequest, engine: PromptEngine, llm: LLMEnhancer) -> EnhancedPrompt:
+    if not body.use_llm:
+        return engine.enhance(body.prompt, body.model, body.target, body.style, body.genre)
+    if not get_settings().openai_api_key:
+        raise HTTPException(status_code=503, detail="LLM enhancement is not configured")
+    target = body.target or target_for_model(body.model)
+    try:
+        return await llm.enhance(body.prompt, target, body.style, body.genre)
+    except LLMError as exc:
+        logger.warning("LLM enhancement failed: %s", exc)
+        raise HTTPException(status_code=502, detail="LLM enhancement failed")
+
+
+@router.post("/enhance")
+async def enhance_prompt(
+    body: EnhanceRequest,
+    engine: PromptEngine = Depends(get_prompt_engine),
+    llm: LLMEnhancer = Depends(get_llm_enhancer),
+):
+    return asdict(await _enhance(body, engine, llm))
+
+
+@router.post("/enhance/batch")
+async def enhance_prompts(
+    body: EnhanceBatchRequest,
+    engine: PromptEngine = Depends(get_prompt_engine),
+    llm: LLMEnhancer = Depends(get_llm_enhancer),
+):
+    """Enhance many prompts at once. Items that fail come back as
+    ``{"error", "status_code"}`` in their place instead of failing the batch."""
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def run(item: EnhanceRequest) -> EnhancedPrompt:
+        if not item.use_llm:
+            return await _enhance(item, engine, llm)
+        async with semaphore:
+            return await _enhance(item, engine, llm)
+
+    def result(outcome: Any) -> Dict[str, Any]:
+        # One failed item must not cost the caller every other result.
+        if isinstance(outcome, HTTPException):
+            return {"error": outcome.detail, "status_code": outcome.status_code}
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return asdict(outcome)
+
+    outcomes = await asyncio.gather(*(run(item) for item in body.items), return_exceptions=True)
+    return {"results": [result(outcome) for outcome in outcomes]}
+
+
+@router.get("/presets")
+async def prompt_presets(engine: PromptEngine = Depends(get_prompt_engine)):
+    return {"styles": engine.styles, "genres": engine.genres, "cache": engine.stats()}
@@ -0,0 +1,137 @@
+"""Cold-start benchmark for the API.
+
+Every sample runs in a fresh interpreter, the way a serverless instance
+starts. It measures:
+
+* ``import_s``: ``import app.main``, inside the process.
+* ``create_app_s``: building the app with ``create_app()``.
+* ``process_s``: interpreter start to both of the above finishing, seen
+  from outside.
+* ``first_response_s``: spawning ``uvicorn app.main:create_app --factory``
+  to the first successful ``GET /health``, including lifespan startup.
+
+Run from ``backend/``::
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --runs 10 --output cold_start.json
+
+The first, untimed run fills the bytecode cache so every sample is
+measured the same way. Results are printed as JSON.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.stats import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+app.main.create_app()
+built = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "create_app_s": built - imported}))
+"""
+
+
+def _env(extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    env = {**os.environ, "LOG_LEVEL": "warning", **(extra or {})}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(env: Dict[str, str]) -> Dict[str, float]:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_s"] = time.perf_counter() - start
+    return sample
+
+
+def _health(port: int) -> bool:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+    try:
+        conn.request("GET", "/health")
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        conn.close()
+
+
+def measure_first_response(env: Dict[str, str], timeout: float = 30.0, poll: float = 0.002) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"Server exited early:\n{server.stderr.read().decode()}")
+            if _health(port):
+                return time.perf_counter() - start
+            time.sleep(poll)
+        raise TimeoutError(f"No response from /health within {timeout}s")
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+            server.wait()
+
+
+def run(runs: int, env: Dict[str, str]) -> Dict[str, object]:
+    measure_import(env)
+    imports: List[Dict[str, float]] = [measure_import(env) for _ in range(runs)]
+    first_responses = [measure_first_response(env) for _ in range(runs)]
+    return {
+        "runs": runs,
+        "python": sys.version.split()[0],
+        "warm_providers": env.get("WARM_PROVIDERS", ""),
+        "import_s": summarize([sample["import_s"] for sample in imports]),
+        "create_app_s": summarize([sample["create_app_s"] for sample in imports]),
+        "process_s": summarize([sample["process_s"] for sample in imports]),
+        "first_response_s": summarize(first_responses),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warm-providers", default=None,
+                        help="Value for WARM_PROVIDERS, e.g. 'replicate' (default: inherit)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    extra = {"WARM_PROVIDERS": args.warm_providers} if args.warm_providers is not None else None
+    report = json.dumps(run(args.runs, _env(extra)), indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,436 @@
+"""Offline load driver for the API.
+
+Starts the fake providers and the backend on free local ports, with
+throwaway cache, history and asset directories. It then runs each
+scenario in ``scenarios.json`` at a fixed concurrency and prints one JSON
+report. Provider credits are never touched: the backend talks to
+``fakes.replicate``, and each scenario sets the fakes' latency
+distribution, failure rate and 429 behaviour through ``PUT /_fake/config``.
+
+Run from ``backend/``::
+
+    python -m benchmarks.load
+    python -m benchmarks.load --only generate-end-to-end --output load.json
+    python -m benchmarks.load --scenarios my_scenarios.json --scale 0.2
+
+To drive a stack that is already running, pass ``--target`` plus
+``--fake name=url`` for each fake to configure. Add ``--pid`` to sample the
+backend's memory.
+
+Scenario kinds:
+
+* ``generate``: ``POST /predictions``. With ``"wait": true`` it also follows
+  ``/predictions/{id}/events`` to a terminal status, so latency is end to
+  end. ``"seeded"`` makes requests cacheable. ``"unique": false`` repeats
+  one input, which exercises request coalescing and the result cache.
+* ``status``: ``GET /predictions/{id}`` over a pool of predictions created
+  beforehand.
+* ``asset``: ``GET /assets/{path}``, optionally with ``query``
+  (e.g. ``{"w": 256}``) and a ``range`` header.
+* ``get``: plain ``GET`` of ``path``, e.g. ``/health`` or ``/history``.
+
+Per scenario the report has throughput, latency percentiles, outcome
+counts, backend RSS (Linux ``/proc``) and the fakes' counters.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.stats import summarize
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SCENARIOS = Path(__file__).resolve().parent / "scenarios.json"
+FAKE_APPS = {"replicate": "fakes.replicate:app", "fal": "fakes.fal:app", "luma": "fakes.luma:app"}
+TERMINAL_STATUSES = {"succeeded", "failed", "canceled"}
+
+# One request's outcome: (latency seconds, ok, outcome label).
+Sample = Tuple[float, bool, str]
+Request = Callable[[httpx.AsyncClient, int], Awaitable[Tuple[bool, str]]]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_mb(pid: Optional[int]) -> Optional[float]:
+    """Resident set size of ``pid`` in MiB, or ``None`` where /proc is unavailable."""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+class Stack:
+    """The backend and the fakes it talks to, as local subprocesses."""
+
+    def __init__(self, fakes: List[str], backend_env: Dict[str, str]):
+        self.fakes = {name: f"http://127.0.0.1:{_free_port()}" for name in {"replicate", *fakes}}
+        self.target = f"http://127.0.0.1:{_free_port()}"
+        self.backend_env = backend_env
+        self.workdir = Path(tempfile.mkdtemp(prefix="medusa-load-"))
+        self.backend_pid: Optional[int] = None
+        self._processes: List[subprocess.Popen] = []
+
+    def _spawn(self, app: str, url: str, env: Dict[str, str], factory: bool = False) -> subprocess.Popen:
+        port = url.rsplit(":", 1)[1]
+        command = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", port,
+                   "--log-level", "warning", "--no-access-log"]
+        if factory:
+            command.append("--factory")
+        process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        self._processes.append(process)
+        return process
+
+    def _write_assets(self) -> None:
+        uploads = self.workdir / "uploads"
+        uploads.mkdir()
+        (uploads / "sample.bin").write_bytes(os.urandom(1 << 20))
+        try:
+            from PIL import Image
+
+            Image.radial_gradient("L").resize((1024, 1024)).convert("RGB").save(uploads / "sample.png")
+        except ImportError:
+            from fakes.behavior import PNG_BYTES
+
+            (uploads / "sample.png").write_bytes(PNG_BYTES)
+
+    async def start(self) -> None:
+        self._write_assets()
+        # The fake signs its webhooks with a throwaway secret the backend verifies.
+        webhook_secret = "whsec_" + base64.b64encode(secrets.token_bytes(24)).decode()
+        env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), "FAKE_REPLICATE_WEBHOOK_SECRET": webhook_secret}
+        for name, url in self.fakes.items():
+            self._spawn(FAKE_APPS[name], url, env)
+        backend = self._spawn("app.main:create_app", self.target, {
+            **env,
+            "REPLICATE_API_BASE": f"{self.fakes['replicate']}/v1",
+            "REPLICATE_API_TOKEN": "fake",
+            "REPLICATE_WEBHOOK_SECRET": webhook_secret,
+            "PUBLIC_BASE_URL": self.target,
+            "CACHE_DIR": str(self.workdir / "cache"),
+            "HISTORY_DB_PATH": str(self.workdir / "history.sqlite3"),
+            "ASSETS_DIR": str(self.workdir / "uploads"),
+            "DERIVATIVES_DIR": str(self.workdir / "derivatives"),
+            "LOG_LEVEL": "warning",
+            "MONITORING_SAMPLE_RATE": "0",
+            **self.backend_env,
+        }, factory=True)
+        self.backend_pid = backend.pid
+
+        async with httpx.AsyncClient(timeout=1) as client:
+            await _wait_ready(client, f"{self.target}/health", self._processes)
+            for url in self.fakes.values():
+                await _wait_ready(client, f"{url}/_fake/config", self._processes)
+
+    def stop(self) -> None:
+        for process in self._processes:
+            process.terminate()
+        for process in self._processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+async def _wait_ready(client: httpx.AsyncClient, url: str, processes: List[subprocess.Popen],
+                      timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for process in processes:
+            if process.poll() is not None:
+                raise RuntimeError(f"{' '.join(process.args)} exited:\n{process.stderr.read().decode()}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+# -- request factories -----------------------------------------------------
+
+def _generate_body(scenario: Dict[str, Any], n: int) -> Dict[str, Any]:
+    unique = scenario.get("unique", True)
+    input = {"prompt": f"load test {n if unique else 0}", **scenario.get("input", {})}
+    if scenario.get("seeded"):
+        input["seed"] = n if unique else 0
+    return {"model": scenario.get("model", "black-forest-labs/flux-schnell"), "input": input,
+            "cache": scenario.get("cache", True)}
+
+
+async def _follow(client: httpx.AsyncClient, prediction_id: str) -> str:
+    status = "unknown"
+    async with client.stream("GET", f"/predictions/{prediction_id}/events") as response:
+        async for line in response.aiter_lines():
+            if line.startswith("data:"):
+                status = json.loads(line[5:]).get("status", status)
+    return status
+
+
+def generate_request(scenario: Dict[str, Any]) -> Request:
+    wait = scenario.get("wait", False)
+
+    async def request(client: httpx.AsyncClient, n: int) -> Tuple[bool, str]:
+        response = await client.post("/predictions", json=_generate_body(scenario, n))
+        if response.status_code >= 400:
+            return False, str(response.status_code)
+        prediction = response.json()
+        status = prediction.get("status")
+        if wait and status not in TERMINAL_STATUSES:
+            status = await _follow(client, prediction["id"])
+        if wait or status in TERMINAL_STATUSES:
+            return status == "succeeded", status
+        return True, str(response.status_code)
+
+    return request
+
+
+def get_request(path: str, params: Optional[Dict[str, Any]] = None,
+                headers: Optional[Dict[str, str]] = None) -> Request:
+    async def request(client: httpx.AsyncClient, n: int) -> Tuple[bool, str]:
+        response = await client.get(path, params=params, headers=headers)
+        return response.status_code < 400, str(response.status_code)
+
+    return request
+
+
+async def status_request(client: httpx.AsyncClient, scenario: Dict[str, Any]) -> Request:
+    """Create the pool of predictions to poll, then round-robin over them."""
+    ids = []
+    for n in range(scenario.get("pool", 32)):
+        response = await client.post("/predictions", json=_generate_body({**scenario, "seeded": False}, n))
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+
+    async def request(client: httpx.AsyncClient, n: int) -> Tuple[bool, str]:
+        response = await client.get(f"/predictions/{ids[n % len(ids)]}")
+        return response.status_code < 400, str(response.status_code)
+
+    return request
+
+
+async def build_request(client: httpx.AsyncClient, scenario: Dict[str, Any]) -> Request:
+    kind = scenario["kind"]
+    if kind == "generate":
+        return generate_request(scenario)
+    if kind == "status":
+        return await status_request(client, scenario)
+    if kind == "asset":
+        headers = {"Range": scenario["range"]} if scenario.get("range") else None
+        return get_request(f"/assets/{scenario.get('path', 'sample.bin')}", scenario.get("query"), headers)
+    if kind == "get":
+        return get_request(scenario["path"], scenario.get("query"))
+    raise ValueError(f"Unknown scenario kind {kind!r}")
+
+
+# -- running ---------------------------------------------------------------
+
+async def _drive(client: httpx.AsyncClient, request: Request, concurrency: int,
+                 total: Optional[int], duration: Optional[float]) -> Tuple[List[Sample], float]:
+    """Closed loop: ``concurrency`` workers each send the next request as
+    soon as their previous one finishes."""
+    samples: List[Sample] = []
+    issued = 0
+    start = time.perf_counter()
+    deadline = start + duration if duration else None
+
+    async def worker() -> None:
+        nonlocal issued
+        while (total is None or issued < total) and (deadline is None or time.perf_counter() < deadline):
+            n = issued
+            issued += 1
+            began = time.perf_counter()
+            try:
+                ok, outcome = await request(client, n)
+            except httpx.TimeoutException:
+                ok, outcome = False, "timeout"
+            except httpx.HTTPError as exc:
+                ok, outcome = False, type(exc).__name__
+            samples.append((time.perf_counter() - began, ok, outcome))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+async def _sample_memory(pid: Optional[int], readings: List[float], interval: float = 0.1) -> None:
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            readings.append(value)
+        await asyncio.sleep(interval)
+
+
+async def _configure_fakes(fakes: Dict[str, str], baselines: Dict[str, Dict[str, Any]],
+                           config: Dict[str, Dict[str, Any]]) -> None:
+    async with httpx.AsyncClient(timeout=10) as client:
+        for name, url in fakes.items():
+            response = await client.put(f"{url}/_fake/config", json={**baselines[name], **config.get(name, {})})
+            response.raise_for_status()
+            await client.delete(f"{url}/_fake/stats")
+
+
+async def _settle(fakes: Dict[str, str], timeout: float) -> Dict[str, Dict[str, int]]:
+    """Wait for jobs still running in the fakes, then return their counters,
+    so one scenario's leftovers do not spill into the next."""
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=10) as client:
+        while True:
+            stats = {name: (await client.get(f"{url}/_fake/stats")).json() for name, url in fakes.items()}
+            # Per fake, so one fake's miscount cannot hide another's running jobs.
+            running = sum(max(s["created"] - s["succeeded"] - s["failed"] - s["canceled"], 0)
+                          for s in stats.values())
+            if running <= 0 or time.monotonic() >= deadline:
+                return stats
+            await asyncio.sleep(0.1)
+
+
+async def run_scenario(target: str, scenario: Dict[str, Any], fakes: Dict[str, str],
+                       baselines: Dict[str, Dict[str, Any]], defaults: Dict[str, Dict[str, Any]],
+                       pid: Optional[int], scale: float) -> Dict[str, Any]:
+    providers = {name: {**defaults.get(name, {}), **scenario.get("providers", {}).get(name, {})}
+                 for name in fakes}
+    await _configure_fakes(fakes, baselines, providers)
+
+    concurrency = scenario.get("concurrency", 8)
+    total = max(1, round(scenario["requests"] * scale)) if "requests" in scenario else None
+    duration = scenario["duration"] * scale if "duration" in scenario else None
+    if total is None and duration is None:
+        total = concurrency * 10
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, limits=limits,
+                                 timeout=scenario.get("timeout", 120)) as client:
+        request = await build_request(client, scenario)
+        memory: List[float] = []
+        baseline_rss = rss_mb(pid)
+        sampler = asyncio.get_running_loop().create_task(_sample_memory(pid, memory))
+        try:
+            samples, elapsed = await _drive(client, request, concurrency, total, duration)
+        finally:
+            sampler.cancel()
+        end_rss = rss_mb(pid)
+
+    provider_stats = await _settle(fakes, scenario.get("settle", 60))
+    outcomes: Dict[str, int] = {}
+    for _, _, outcome in samples:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    succeeded = sum(1 for _, ok, _ in samples if ok)
+
+    return {
+        "name": scenario["name"],
+        "kind": scenario["kind"],
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "succeeded": succeeded,
+        "errors": len(samples) - succeeded,
+        "error_rate": round((len(samples) - succeeded) / len(samples), 4) if samples else 0.0,
+        "outcomes": outcomes,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": summarize([latency * 1000 for latency, _, _ in samples], digits=2),
+        "memory_mb": None if baseline_rss is None else {
+            "start": round(baseline_rss, 1),
+            "end": round(end_rss or baseline_rss, 1),
+            "peak": round(max(memory + [baseline_rss, end_rss or 0]), 1),
+        },
+        "providers": {name: {"config": providers[name] or None, **stats}
+                      for name, stats in provider_stats.items()},
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    spec = json.loads(Path(args.scenarios).read_text())
+    scenarios = [s for s in spec["scenarios"] if not args.only or s["name"] in args.only]
+    if not scenarios:
+        raise SystemExit("No scenarios selected")
+    defaults = spec.get("providers", {})
+
+    stack: Optional[Stack] = None
+    if args.target:
+        target, fakes, pid = args.target.rstrip("/"), dict(args.fake), args.pid
+    else:
+        configured = {name for s in scenarios for name in s.get("providers", {})} | set(defaults)
+        stack = Stack(sorted(configured & set(FAKE_APPS)), spec.get("backend_env", {}))
+        await stack.start()
+        target, fakes, pid = stack.target, stack.fakes, stack.backend_pid
+
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            baselines = {name: (await client.get(f"{url}/_fake/config")).json() for name, url in fakes.items()}
+        results = []
+        for scenario in scenarios:
+            print(f"running {scenario['name']}...", file=sys.stderr)
+            results.append(await run_scenario(target, scenario, fakes, baselines, defaults, pid, args.scale))
+    finally:
+        if stack is not None:
+            stack.stop()
+
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "scenario_file": str(args.scenarios),
+            "scale": args.scale,
+            "target": args.target or "local",
+            "backend_env": spec.get("backend_env", {}),
+        },
+        "scenarios": results,
+    }
+
+
+def _fake_arg(value: str) -> Tuple[str, str]:
+    name, _, url = value.partition("=")
+    if not url:
+        raise argparse.ArgumentTypeError("expected name=url")
+    return name, url.rstrip("/")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=str(DEFAULT_SCENARIOS))
+    parser.add_argument("--only", nargs="*", help="Run only these scenario names")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Multiply every scenario's request count/duration (e.g. 0.1 for a smoke run)")
+    parser.add_argument("--target", help="Base URL of a running backend instead of starting one")
+    parser.add_argument("--fake", type=_fake_arg, action="append", default=[],
+                        help="name=url of a running fake to configure (with --target)")
+    parser.add_argument("--pid", type=int, help="Backend process to sample memory from (with --target)")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(args)), indent=2)
+    print(report)
+    if args.output:
+        Path(args.output).write_text(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
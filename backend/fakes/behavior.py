@@ -0,0 +1,209 @@
+"""Configurable latency, failures and rate limiting shared by the fakes.
+
+Every fake reads its starting behavior from ``FAKE_<PROVIDER>_*``
+environment variables and can be reconfigured while running through
+``PUT /_fake/config``, which lets the load driver change conditions between
+scenarios without restarting anything:
+
+* ``queue_latency`` / ``run_latency``: time a job spends waiting and
+  running. Accepts ``0.5``, ``fixed:0.5``, ``uniform:0.2,1.5``,
+  ``normal:1.0,0.25``, ``lognormal:<median>,<sigma>`` or ``exp:<mean>``.
+* ``failure_rate``: share of accepted jobs that end up failed.
+* ``error_rate``: share of submissions answered with a 500.
+* ``throttle_rate``: share of submissions answered with a 429.
+* ``rate_limit`` / ``burst``: submissions per second allowed before
+  answering 429 (0 disables), like a real provider's account limit.
+* ``retry_after``: ``Retry-After`` seconds sent with every 429.
+* ``seed``: seeds the random generator so runs are repeatable.
+"""
+import asyncio
+import base64
+import math
+import os
+import random
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
+
+# 1x1 transparent PNG served as every image output.
+PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+# Just an MP4 ``ftyp`` box: enough for content sniffing, not for playback.
+MP4_BYTES = bytes.fromhex("0000001866747970") + b"mp42\0\0\0\0mp42isom"
+
+_callback_client: Optional[httpx.AsyncClient] = None
+# The event loop only keeps weak references to tasks; hold the simulated jobs.
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def spawn(coro) -> None:
+    """Run a simulated job in the background, keeping a reference to it."""
+    task = asyncio.get_running_loop().create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Turn a latency spec into a sampler returning seconds (never negative)."""
+    kind, _, params = str(spec).strip().partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    try:
+        values = [float(value) for value in params.split(",")]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec {spec!r}") from None
+
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: max(values[0], 0.0)
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(rng.gauss(*values), 0.0)
+    if kind == "lognormal" and len(values) == 2 and values[0] > 0:
+        mu = math.log(values[0])
+        return lambda rng: rng.lognormvariate(mu, values[1])
+    if kind == "exp" and len(values) == 1 and values[0] > 0:
+        return lambda rng: rng.expovariate(1 / values[0])
+    raise ValueError(f"Invalid latency spec {spec!r}")
+
+
+def _rate(value: Any, name: str) -> float:
+    rate = float(value)
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"{name} must be between 0 and 1")
+    return rate
+
+
+class Behavior:
+    DEFAULTS: Dict[str, Any] = {
+        "queue_latency": "0.5", "run_latency": "0.5", "failure_rate": 0.0, "error_rate": 0.0,
+        "throttle_rate": 0.0, "rate_limit": 0.0, "burst": 1, "retry_after": 1, "seed": None,
+    }
+
+    def __init__(self, **config: Any):
+        self._config: Dict[str, Any] = dict(self.DEFAULTS)
+        self.update(config)
+
+    @classmethod
+    def from_env(cls, prefix: str, default_latency: str = "0.5") -> "Behavior":
+        values: Dict[str, Any] = {"queue_latency": default_latency, "run_latency": default_latency}
+        for field in cls.DEFAULTS:
+            value = os.getenv(f"{prefix}_{field.upper()}")
+            if value:
+                values[field] = value
+        return cls(**values)
+
+    def update(self, changes: Dict[str, Any]) -> None:
+        """Apply a partial configuration; validates before changing anything."""
+        unknown = set(changes) - set(self.DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+        config = {**self._config, **changes}
+
+        queue = parse_latency(config["queue_latency"])
+        run = parse_latency(config["run_latency"])
+        failure_rate = _rate(config["failure_rate"], "failure_rate")
+        error_rate = _rate(config["error_rate"], "error_rate")
+        throttle_rate = _rate(config["throttle_rate"], "throttle_rate")
+        rate_limit = max(float(config["rate_limit"]), 0.0)
+        burst = max(int(config["burst"]), 1)
+        retry_after = max(int(config["retry_after"]), 0)
+        seed = int(config["seed"]) if config["seed"] not in (None, "") else None
+
+        self.queue_latency, self._queue = str(config["queue_latency"]), queue
+        self.run_latency, self._run = str(config["run_latency"]), run
+        self.failure_rate = failure_rate
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.retry_after = retry_after
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._config = self.as_dict()
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.DEFAULTS}
+
+    def queue_delay(self) -> float:
+        return self._queue(self.rng)
+
+    def run_delay(self) -> float:
+        return self._run(self.rng)
+
+    def fails(self) -> bool:
+        return self.rng.random() < self.failure_rate
+
+    def _over_limit(self) -> bool:
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate_limit)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    def admit(self, stats: Dict[str, int]) -> Optional[JSONResponse]:
+        """Decide whether a submission is accepted. Returns the error
+        response to send instead, or ``None`` to go ahead."""
+        if self.error_rate and self.rng.random() < self.error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"detail": "Internal server error (injected)"}, status_code=500)
+        if self._over_limit() or (self.throttle_rate and self.rng.random() < self.throttle_rate):
+            stats["throttled"] += 1
+            return JSONResponse(
+                {"detail": "Request was throttled (injected)"},
+                status_code=429,
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        return None
+
+
+async def deliver(url: str, body: bytes, headers: Dict[str, str], stats: Dict[str, int]) -> None:
+    """POST a webhook/callback through one pooled client, ignoring failures."""
+    global _callback_client
+    if _callback_client is None:
+        _callback_client = httpx.AsyncClient(timeout=10)
+    try:
+        await _callback_client.post(url, content=body, headers=headers)
+        stats["webhooks_sent"] += 1
+    except httpx.HTTPError:
+        pass
+
+
+def new_stats() -> Dict[str, int]:
+    return {"created": 0, "gets": 0, "succeeded": 0, "failed": 0, "canceled": 0,
+            "throttled": 0, "errors": 0, "webhooks_sent": 0}
+
+
+def add_control_routes(app: FastAPI, behavior: Behavior, stats: Dict[str, int]) -> None:
+    """``/_fake/config`` (GET/PUT) and ``/_fake/stats`` (GET/DELETE to reset)."""
+
+    @app.get("/_fake/config")
+    async def get_config():
+        return behavior.as_dict()
+
+    @app.put("/_fake/config")
+    async def put_config(changes: Dict[str, Any]):
+        try:
+            behavior.update(changes)
+        except (TypeError, ValueError) as exc:
+            raise HTTPException(status_code=422, detail=str(exc))
+        return behavior.as_dict()
+
+    @app.get("/_fake/stats")
+    async def get_stats():
+        return stats
+
+    @app.delete("/_fake/stats")
+    async def reset_stats():
+        stats.update(new_stats())
+        return stats
@@ -0,0 +1,162 @@
+"""Local stand-in for the fal.ai queue API (``https://queue.fal.run``).
+
+Run it and point the fal client's proxy or base URL at it::
+
+    uvicorn fakes.fal:app --port 8002
+
+``POST /{app_id}`` enqueues a request. ``GET /{app_id}/requests/{id}/status``
+reports ``IN_QUEUE -> IN_PROGRESS -> COMPLETED``. ``GET /{app_id}/requests/{id}``
+returns the result, and ``PUT .../cancel`` cancels a request that has not
+finished. Apps with ``video`` in their id return ``{"video": {...}}``; all
+others return ``{"images": [...]}``. When the request has a ``fal_webhook``
+query parameter, the result is POSTed there on completion. Latency, failures
+and 429s are set with ``FAKE_FAL_*`` variables or ``PUT /_fake/config``
+(see ``fakes.behavior``).
+"""
+import asyncio
+import json
+import time
+import uuid
+from typing import Any, Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+from fakes.behavior import MP4_BYTES, PNG_BYTES, Behavior, add_control_routes, deliver, new_stats, spawn
+
+app = FastAPI(title="Fake fal")
+behavior = Behavior.from_env("FAKE_FAL")
+requests: Dict[str, Dict[str, Any]] = {}
+stats = new_stats()
+add_control_routes(app, behavior, stats)
+
+
+def _root(app_id: str) -> str:
+    # fal serves request URLs under the owner/app pair, without sub-paths.
+    return "/".join(app_id.strip("/").split("/")[:2])
+
+
+def _urls(base_url: str, app_id: str, request_id: str) -> Dict[str, str]:
+    root = f"{base_url}{_root(app_id)}/requests/{request_id}"
+    return {"response_url": root, "status_url": f"{root}/status", "cancel_url": f"{root}/cancel"}
+
+
+def _result(job: Dict[str, Any], base_url: str, run_time: float) -> Dict[str, Any]:
+    if "video" in job["app_id"]:
+        return {"video": {"url": f"{base_url}files/{job['id']}.mp4", "content_type": "video/mp4",
+                          "file_size": len(MP4_BYTES)}}
+    return {
+        "images": [{"url": f"{base_url}files/{job['id']}.png", "width": 1, "height": 1,
+                    "content_type": "image/png"}],
+        "seed": job["input"].get("seed", 0),
+        "has_nsfw_concepts": [False],
+        "prompt": job["input"].get("prompt", ""),
+        "timings": {"inference": run_time},
+    }
+
+
+async def _run(request_id: str, base_url: str) -> None:
+    job = requests[request_id]
+    await asyncio.sleep(behavior.queue_delay())
+    if job["status"] == "CANCELLED":
+        return
+    job.update(status="IN_PROGRESS", started_at=time.time())
+
+    run_time = behavior.run_delay()
+    await asyncio.sleep(run_time)
+    if job["status"] == "CANCELLED":
+        return
+    if behavior.fails():
+        job.update(error="Request failed (injected)")
+        stats["failed"] += 1
+    else:
+        job.update(result=_result(job, base_url, run_time))
+        stats["succeeded"] += 1
+    job.update(status="COMPLETED", completed_at=time.time())
+
+    if job["webhook"]:
+        payload = {
+            "request_id": request_id,
+            "status": "ERROR" if job["error"] else "OK",
+            "payload": job["result"],
+            "error": job["error"],
+        }
+        await deliver(job["webhook"], json.dumps(payload).encode(),
+                      {"Content-Type": "application/json"}, stats)
+
+
+def _job(request_id: str) -> Dict[str, Any]:
+    job = requests.get(request_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return job
+
+
+@app.get("/files/{name}")
+async def get_file(name: str):
+    if name.endswith(".mp4"):
+        return Response(MP4_BYTES, media_type="video/mp4")
+    return Response(PNG_BYTES, media_type="image/png")
+
+
+@app.get("/{app_id:path}/requests/{request_id}/status")
+async def get_status(app_id: str, request_id: str, request: Request):
+    stats["gets"] += 1
+    job = _job(request_id)
+    body: Dict[str, Any] = {"status": job["status"], "request_id": request_id,
+                            "response_url": _urls(str(request.base_url), app_id, request_id)["response_url"]}
+    if job["status"] == "IN_QUEUE":
+        # Jobs leave the queue on their own timers, so there is no real order.
+        body["queue_position"] = 0
+    else:
+        body["logs"] = []
+    if job["status"] == "COMPLETED" and job["started_at"]:
+        body["metrics"] = {"inference_time": job["completed_at"] - job["started_at"]}
+    return body
+
+
+@app.put("/{app_id:path}/requests/{request_id}/cancel", status_code=202)
+async def cancel_request(app_id: str, request_id: str):
+    job = _job(request_id)
+    if job["status"] in ("COMPLETED", "CANCELLED"):
+        return JSONResponse({"status": "ALREADY_COMPLETED"}, status_code=400)
+    job["status"] = "CANCELLED"
+    stats["canceled"] += 1
+    return {"status": "CANCELLATION_REQUESTED"}
+
+
+@app.get("/{app_id:path}/requests/{request_id}")
+async def get_result(app_id: str, request_id: str):
+    stats["gets"] += 1
+    job = _job(request_id)
+    if job["status"] == "CANCELLED":
+        raise HTTPException(status_code=400, detail="Request was cancelled")
+    if job["status"] != "COMPLETED":
+        raise HTTPException(status_code=400, detail="Request is still in progress")
+    if job["error"]:
+        raise HTTPException(status_code=500, detail=job["error"])
+    return job["result"]
+
+
+@app.post("/{app_id:path}")
+async def submit(app_id: str, request: Request):
+    rejected = behavior.admit(stats)
+    if rejected is not None:
+        return rejected
+    request_id = str(uuid.uuid4())
+    base_url = str(request.base_url)
+    requests[request_id] = {
+        "id": request_id,
+        "app_id": app_id,
+        "input": await request.json(),
+        "status": "IN_QUEUE",
+        "result": None,
+        "error": None,
+        "webhook": request.query_params.get("fal_webhook"),
+        "created_at": time.time(),
+        "started_at": None,
+        "completed_at": None,
+    }
+    stats["created"] += 1
+    spawn(_run(request_id, base_url))
+    return {"request_id": request_id, **_urls(base_url, app_id, request_id), "queue_position": 0}
@@ -0,0 +1,122 @@
+"""Local stand-in for the Luma Dream Machine API.
+
+Run it and use ``http://localhost:8003/dream-machine/v1`` as the client's
+base URL::
+
+    uvicorn fakes.luma:app --port 8003
+
+Generations move ``queued -> dreaming -> completed`` (or ``failed``).
+``assets.video`` points back at this server. When ``callback_url`` is set,
+the generation is POSTed there on every state change, as Luma does.
+Latency, failures and 429s are set with ``FAKE_LUMA_*`` variables or
+``PUT /_fake/config`` (see ``fakes.behavior``).
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+from fakes.behavior import MP4_BYTES, PNG_BYTES, Behavior, add_control_routes, deliver, new_stats, spawn
+
+API_PREFIX = "/dream-machine/v1"
+
+app = FastAPI(title="Fake Luma")
+# Video generations are slow; default to a few seconds of "dreaming".
+behavior = Behavior.from_env("FAKE_LUMA", default_latency="2.0")
+generations: Dict[str, Dict[str, Any]] = {}
+callbacks: Dict[str, str] = {}
+stats = new_stats()
+add_control_routes(app, behavior, stats)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _changed(generation: Dict[str, Any]) -> None:
+    url = callbacks.get(generation["id"])
+    if url:
+        await deliver(url, json.dumps(generation).encode(), {"Content-Type": "application/json"}, stats)
+
+
+async def _run(generation_id: str, base_url: str) -> None:
+    generation = generations[generation_id]
+    await asyncio.sleep(behavior.queue_delay())
+    if generation_id not in generations:
+        return
+    generation["state"] = "dreaming"
+    await _changed(generation)
+
+    await asyncio.sleep(behavior.run_delay())
+    if generation_id not in generations:
+        return
+    if behavior.fails():
+        generation.update(state="failed", failure_reason="Generation failed (injected)")
+        stats["failed"] += 1
+    else:
+        generation.update(state="completed", assets={
+            "video": f"{base_url}files/{generation_id}.mp4",
+            "image": f"{base_url}files/{generation_id}.png",
+        })
+        stats["succeeded"] += 1
+    await _changed(generation)
+
+
+@app.post(f"{API_PREFIX}/generations", status_code=201)
+@app.post(f"{API_PREFIX}/generations/video", status_code=201)
+async def create_generation(request: Request):
+    rejected = behavior.admit(stats)
+    if rejected is not None:
+        return rejected
+    body: Dict[str, Any] = await request.json()
+    if not body.get("prompt") and not body.get("keyframes"):
+        raise HTTPException(status_code=400, detail="prompt or keyframes is required")
+
+    generation_id = str(uuid.uuid4())
+    generations[generation_id] = {
+        "id": generation_id,
+        "generation_type": "video",
+        "state": "queued",
+        "failure_reason": None,
+        "created_at": _now(),
+        "assets": None,
+        "model": body.get("model", "ray-1-6"),
+        "request": {k: v for k, v in body.items() if k != "callback_url"},
+    }
+    if body.get("callback_url"):
+        callbacks[generation_id] = body["callback_url"]
+    stats["created"] += 1
+    spawn(_run(generation_id, str(request.base_url)))
+    return generations[generation_id]
+
+
+@app.get(f"{API_PREFIX}/generations/{{generation_id}}")
+async def get_generation(generation_id: str):
+    stats["gets"] += 1
+    generation = generations.get(generation_id)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    return generation
+
+
+@app.delete(f"{API_PREFIX}/generations/{{generation_id}}", status_code=204)
+async def delete_generation(generation_id: str):
+    generation = generations.pop(generation_id, None)
+    if generation is None:
+        raise HTTPException(status_code=404, detail="Generation not found")
+    callbacks.pop(generation_id, None)
+    # Deleting a finished generation only removes it; it was already counted.
+    if generation["state"] in ("queued", "dreaming"):
+        stats["canceled"] += 1
+    return Response(status_code=204)
+
+
+@app.get("/files/{name}")
+async def get_file(name: str):
+    if name.endswith(".mp4"):
+        return Response(MP4_BYTES, media_type="video/mp4")
+    return Response(PNG_BYTES, media_type="image/png")
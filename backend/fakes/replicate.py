@@ -0,0 +1,152 @@
+"""Local stand-in for the Replicate HTTP API.
+
+Run it next to the backend to exercise the prediction flow offline::
+
+    uvicorn fakes.replicate:app --port 8001
+    REPLICATE_API_BASE=http://localhost:8001/v1 uvicorn app.main:app
+
+Predictions move ``starting -> processing -> succeeded`` (or ``failed``) on
+a timer and the fake delivers ``start`` / ``completed`` webhooks to the URL
+given at creation, signed when ``FAKE_REPLICATE_WEBHOOK_SECRET`` is set.
+Latency, failures and 429s are configured with ``FAKE_REPLICATE_*``
+variables or ``PUT /_fake/config`` (see ``fakes.behavior``).
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+from app.routers.predictions.webhooks import sign
+from fakes.behavior import PNG_BYTES, Behavior, add_control_routes, deliver, new_stats, spawn
+
+# Default seconds spent in each of the "starting" and "processing" states,
+# unless FAKE_REPLICATE_QUEUE_LATENCY / FAKE_REPLICATE_RUN_LATENCY say otherwise.
+STEP_DELAY = os.getenv("FAKE_REPLICATE_STEP_DELAY", "0.5")
+WEBHOOK_SECRET = os.getenv("FAKE_REPLICATE_WEBHOOK_SECRET") or None
+
+app = FastAPI(title="Fake Replicate")
+behavior = Behavior.from_env("FAKE_REPLICATE", default_latency=STEP_DELAY)
+predictions: Dict[str, Dict[str, Any]] = {}
+stats = new_stats()
+add_control_routes(app, behavior, stats)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+async def _send_webhook(prediction: Dict[str, Any]) -> None:
+    url = prediction.get("webhook")
+    if not url:
+        return
+    body = json.dumps({k: v for k, v in prediction.items() if k != "webhook"}).encode()
+    headers = {"Content-Type": "application/json"}
+    if WEBHOOK_SECRET:
+        webhook_id, timestamp = f"msg_{uuid.uuid4().hex}", int(time.time())
+        headers.update({
+            "webhook-id": webhook_id,
+            "webhook-timestamp": str(timestamp),
+            "webhook-signature": sign(WEBHOOK_SECRET, webhook_id, timestamp, body),
+        })
+    await deliver(url, body, headers, stats)
+
+
+async def _run(prediction_id: str, base_url: str) -> None:
+    prediction = predictions[prediction_id]
+    events = set(prediction.get("webhook_events_filter") or ["start", "output", "logs", "completed"])
+
+    await asyncio.sleep(behavior.queue_delay())
+    if prediction["status"] == "canceled":
+        return
+    prediction.update(status="processing", started_at=_now())
+    if "start" in events:
+        await _send_webhook(prediction)
+
+    run_time = behavior.run_delay()
+    await asyncio.sleep(run_time)
+    if prediction["status"] == "canceled":
+        return
+    if behavior.fails():
+        prediction.update(status="failed", completed_at=_now(), error="Prediction failed (injected)")
+    else:
+        prediction.update(
+            status="succeeded",
+            completed_at=_now(),
+            output=[f"{base_url}files/{prediction_id}.png"],
+            metrics={"predict_time": run_time},
+        )
+    stats[prediction["status"]] += 1
+    if "completed" in events:
+        await _send_webhook(prediction)
+
+
+def _create(request: Request, body: Dict[str, Any], model: Optional[str]):
+    rejected = behavior.admit(stats)
+    if rejected is not None:
+        return rejected
+    prediction_id = uuid.uuid4().hex[:26]
+    prediction = {
+        "id": prediction_id,
+        "model": model,
+        "version": body.get("version"),
+        "input": body.get("input", {}),
+        "status": "starting",
+        "output": None,
+        "error": None,
+        "logs": "",
+        "created_at": _now(),
+        "urls": {
+            "get": f"{request.base_url}v1/predictions/{prediction_id}",
+            "cancel": f"{request.base_url}v1/predictions/{prediction_id}/cancel",
+        },
+        "webhook": body.get("webhook"),
+        "webhook_events_filter": body.get("webhook_events_filter"),
+    }
+    predictions[prediction_id] = prediction
+    stats["created"] += 1
+    spawn(_run(prediction_id, str(request.base_url)))
+    return prediction
+
+
+@app.post("/v1/predictions", status_code=201)
+async def create_prediction(request: Request):
+    body = await request.json()
+    if "version" not in body:
+        raise HTTPException(status_code=422, detail="version is required")
+    return _create(request, body, None)
+
+
+@app.post("/v1/models/{owner}/{name}/predictions", status_code=201)
+async def create_model_prediction(owner: str, name: str, request: Request):
+    return _create(request, await request.json(), f"{owner}/{name}")
+
+
+@app.get("/v1/predictions/{prediction_id}")
+async def get_prediction(prediction_id: str):
+    stats["gets"] += 1
+    if prediction_id not in predictions:
+        raise HTTPException(status_code=404, detail="Not found")
+    return predictions[prediction_id]
+
+
+@app.post("/v1/predictions/{prediction_id}/cancel")
+async def cancel_prediction(prediction_id: str):
+    prediction = predictions.get(prediction_id)
+    if prediction is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    if prediction["status"] not in ("succeeded", "failed", "canceled"):
+        prediction.update(status="canceled", completed_at=_now())
+        stats["canceled"] += 1
+        await _send_webhook(prediction)
+    return prediction
+
+
+@app.get("/files/{name}")
+async def get_file(name: str):
+    return Response(PNG_BYTES, media_type="image/png")
@@ -1,7 +1,17 @@
-from fastapi import FastAPI # type: ignore
+"""Local entry point: ``python run.py``.
 
-app = FastAPI()
+Serves the same app as ``uvicorn app.main:app`` through the factory, so
+there is a single FastAPI application to configure.
+"""
+import os
 
-@app.get("/")
-async def root():
-    return {"message": "Hello World"}
+import uvicorn
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "app.main:create_app",
+        factory=True,
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "8000")),
+        reload=os.getenv("RELOAD", "").lower() in ("1", "true", "yes"),
+    )
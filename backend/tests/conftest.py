@@ -0,0 +1,117 @@
+"""Shared fixtures.
+
+Every test gets fresh settings and singletons rooted in its own temporary
+directory. ``client`` runs the app in-process against ``fakes.replicate``:
+provider calls and webhooks go over ASGI transports, so nothing touches
+the network. The fake signs its webhooks with ``WEBHOOK_SECRET``, which the
+backend is configured to verify.
+"""
+import time
+from typing import Any, Callable
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import fakes.behavior
+import fakes.replicate
+from app.core import http, providers
+from app.core.cache import get_result_cache
+from app.core.config import get_settings
+from app.core.prompt_engine import get_llm_enhancer, get_prompt_engine
+from app.core.scheduler import get_scheduler, get_single_flight
+from app.main import create_app
+from app.models.history import get_history_store
+from app.routers.batches.jobs import get_batch_store
+from app.routers.predictions import service
+from tests.support import WEBHOOK_SECRET
+
+SINGLETONS = (
+    get_settings, get_history_store, get_result_cache, get_scheduler, get_single_flight,
+    get_batch_store, get_prompt_engine, get_llm_enhancer, service.get_store,
+)
+
+
+def _refuse(request: httpx.Request) -> httpx.Response:
+    raise httpx.ConnectError("webhook receiver unreachable", request=request)
+
+
+def _lose_webhooks() -> None:
+    # Deliveries fail as if the backend were unreachable.
+    fakes.behavior._callback_client = httpx.AsyncClient(transport=httpx.MockTransport(_refuse))
+
+
+def _wait_until(condition: Callable[[], Any], timeout: float = 5.0) -> Any:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = condition()
+        if value:
+            return value
+        time.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+
+def _reset() -> None:
+    for singleton in SINGLETONS:
+        singleton.cache_clear()
+    providers._instances.clear()
+    service._running.clear()
+    http._client = None
+
+
+@pytest.fixture(autouse=True)
+def env(tmp_path, monkeypatch):
+    values = {
+        "REPLICATE_API_TOKEN": "test-token",
+        "REPLICATE_API_BASE": "http://replicate.test/v1",
+        "PUBLIC_BASE_URL": "http://testserver",
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "ASSETS_DIR": str(tmp_path / "assets"),
+        "DERIVATIVES_DIR": str(tmp_path / "derivatives"),
+        "HISTORY_DB_PATH": str(tmp_path / "history.sqlite3"),
+        "HISTORY_FLUSH_INTERVAL": "0.01",
+        "LOG_LEVEL": "warning",
+        "REPLICATE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+    }
+    for name, value in values.items():
+        monkeypatch.setenv(name, value)
+    for name in ("REPLICATE_WEBHOOK_ALLOW_UNSIGNED", "OPENAI_API_KEY", "WARM_PROVIDERS", "CACHE_STORE_ASSETS"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(fakes.replicate, "WEBHOOK_SECRET", WEBHOOK_SECRET)
+    (tmp_path / "assets").mkdir()
+
+    _reset()
+    fakes.replicate.predictions.clear()
+    fakes.replicate.stats.update(fakes.behavior.new_stats())
+    fakes.replicate.behavior.update({
+        **fakes.behavior.Behavior.DEFAULTS, "queue_latency": "0.02", "run_latency": "0.02", "seed": 1,
+    })
+    _lose_webhooks()
+    yield tmp_path
+    _reset()
+    fakes.behavior._callback_client = None
+
+
+@pytest.fixture
+def client():
+    """The app with provider calls and webhooks wired to ``fakes.replicate``."""
+    app = create_app()
+    with TestClient(app) as test_client:
+        http._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fakes.replicate.app))
+        fakes.behavior._callback_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://testserver"
+        )
+        yield test_client
+
+
+@pytest.fixture
+def lost_webhooks(client):
+    """``client`` whose fake provider never manages to deliver a webhook."""
+    _lose_webhooks()
+    return client
+
+
+@pytest.fixture
+def wait_until():
+    """Poll ``condition`` until it returns something truthy, then return it."""
+    return _wait_until
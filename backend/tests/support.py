@@ -0,0 +1,22 @@
+"""Helpers shared by the test modules that drive ``POST /predictions``."""
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by the backend and ``fakes.replicate`` so webhooks are signed.
+WEBHOOK_SECRET = "whsec_dGVzdC13ZWJob29rLXNlY3JldA=="
+
+SEEDED = {"model": "a/b", "input": {"prompt": "a cat", "seed": 7}}
+
+
+def create_concurrently(client, bodies):
+    with ThreadPoolExecutor(len(bodies)) as pool:
+        return list(pool.map(lambda body: client.post("/predictions", json=body).json(), bodies))
+
+
+def status(client, prediction_id):
+    return client.get(f"/predictions/{prediction_id}").json()["status"]
+
+
+def cached(client, body):
+    """Submit ``body``; return the prediction only if it was a cache hit."""
+    prediction = client.post("/predictions", json=body).json()
+    return prediction if prediction.get("cached") else None
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import fakes.replicate
+from app.core import http, providers
+from app.main import create_app
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+
+def _run(code: str) -> str:
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR)}
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, timeout=60, check=True)
+    return result.stdout.strip()
+
+
+def test_importing_the_app_module_has_no_side_effects():
+    out = _run(
+        "import logging, sys\n"
+        "import app.main\n"
+        "print('app' in vars(app.main), logging.getLogger().handlers == [], 'openai' in sys.modules)\n"
+        "built = app.main.app\n"
+        "print(app.main.app is built, 'openai' in sys.modules)\n"
+    )
+    # Nothing is built or configured on import; the app is built once, on
+    # first lookup, and the OpenAI SDK is still not imported.
+    assert out.splitlines() == ["False True False", "True False"]
+
+
+def test_providers_are_built_on_first_use_and_reused():
+    calls = []
+    providers.register("dummy", lambda: calls.append(1) or object())
+    try:
+        assert providers.loaded()["dummy"] is False
+        client = providers.get_provider("dummy")
+        assert providers.get_provider("dummy") is client
+        assert calls == [1] and providers.loaded()["dummy"] is True
+    finally:
+        providers._factories.pop("dummy")
+        providers._instances.pop("dummy", None)
+    with pytest.raises(LookupError):
+        providers.get_provider("dummy")
+
+
+def test_clients_load_lazily_by_default(client):
+    assert not any(providers.loaded().values())
+    client.post("/predictions", json={"model": "a/b", "input": {}})
+    assert providers.loaded() == {"replicate": True, "openai": False}
+
+
+def test_warm_providers_are_loaded_at_startup_and_failures_are_ignored(monkeypatch, caplog):
+    monkeypatch.setenv("WARM_PROVIDERS", "replicate, missing")
+    http._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fakes.replicate.app))
+    with TestClient(create_app()) as client:
+        assert providers.loaded()["replicate"] is True
+        assert providers.loaded()["openai"] is False
+        assert client.get("/health").json() == {"status": "healthy"}
+    assert "Could not warm provider missing" in caplog.text
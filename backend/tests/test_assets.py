@@ -0,0 +1,160 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from app.core import images
+from app.routers import assets
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def asset(env):
+    (env / "assets" / "clip.bin").write_bytes(CONTENT)
+    return "/assets/clip.bin"
+
+
+def test_full_file_has_validators(client, asset):
+    response = client.get(asset)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    assert response.headers["etag"] and response.headers["last-modified"]
+
+    head = client.head(asset)
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == str(len(CONTENT))
+
+
+def test_matching_etag_is_304(client, asset):
+    etag = client.get(asset).headers["etag"]
+    assert client.get(asset, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(asset, headers={"If-None-Match": '"other", ' + etag}).status_code == 304
+    assert client.get(asset, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize("header, start, end", [
+    ("bytes=10-19", 10, 19),
+    ("bytes=10000-", 10000, len(CONTENT) - 1),
+    ("bytes=-5", len(CONTENT) - 5, len(CONTENT) - 1),
+    ("bytes=100-999999", 100, len(CONTENT) - 1),
+])
+def test_ranges_are_206(client, asset, header, start, end):
+    response = client.get(asset, headers={"Range": header})
+    assert response.status_code == 206
+    assert response.content == CONTENT[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(CONTENT)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+
+def test_unsatisfiable_range_is_416(client, asset):
+    response = client.get(asset, headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_stale_if_range_and_multiple_ranges_send_the_whole_file(client, asset):
+    response = client.get(asset, headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+    assert response.status_code == 200 and response.content == CONTENT
+    response = client.get(asset, headers={"Range": "bytes=0-9,20-29"})
+    assert response.status_code == 200 and response.content == CONTENT
+    etag = response.headers["etag"]
+    assert client.get(asset, headers={"Range": "bytes=0-9", "If-Range": etag}).status_code == 206
+
+
+def test_missing_and_escaping_paths_are_404(client, asset):
+    assert client.get("/assets/missing.bin").status_code == 404
+    assert client.get("/assets/..%2F..%2Fetc%2Fpasswd").status_code == 404
+
+
+@pytest.fixture
+def picture(env):
+    buffer = io.BytesIO()
+    Image.new("RGB", (300, 200), "red").save(buffer, "PNG")
+    (env / "assets" / "picture.png").write_bytes(buffer.getvalue())
+    return "/assets/picture.png"
+
+
+@pytest.fixture
+def in_thread_pool(monkeypatch):
+    """Run derivatives in threads so the test can patch and observe them."""
+    calls, active, peak = [], [0], [0]
+    lock = threading.Lock()
+
+    def make_derivative(*args):
+        with lock:
+            calls.append(args)
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            time.sleep(0.1)
+            images.make_derivative(*args)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    pool = ThreadPoolExecutor(8)
+    monkeypatch.setattr(assets, "make_derivative", make_derivative)
+    monkeypatch.setattr(assets, "_get_pool", lambda: pool)
+    monkeypatch.setattr(assets, "_derivative_slots", asyncio.Semaphore(1))
+    yield calls, peak
+    pool.shutdown()
+
+
+def test_derivative_is_resized_reencoded_and_cached(client, picture, env, monkeypatch):
+    response = client.get(picture, params={"w": 100, "format": "webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == "public, max-age=31536000, immutable"
+    with Image.open(io.BytesIO(response.content)) as image:
+        # Widths snap to the allowed steps.
+        assert (image.format, image.size) == ("WEBP", (128, 85))
+
+    def no_pool():
+        raise AssertionError("derivative should come from disk")
+
+    monkeypatch.setattr(assets, "_get_pool", no_pool)
+    again = client.get(picture, params={"w": 120, "format": "webp"})
+    assert again.content == response.content
+    assert len(list((env / "derivatives").rglob("*.webp"))) == 1
+
+
+def test_identical_derivatives_are_generated_once(client, picture, in_thread_pool):
+    calls, _ = in_thread_pool
+    with ThreadPoolExecutor(4) as pool:
+        responses = list(pool.map(lambda _: client.get(picture, params={"w": 64}), range(4)))
+    assert {r.status_code for r in responses} == {200}
+    assert len({r.content for r in responses}) == 1
+    assert len(calls) == 1
+
+
+def test_derivative_concurrency_is_bounded(client, picture, in_thread_pool):
+    calls, peak = in_thread_pool
+    with ThreadPoolExecutor(3) as pool:
+        widths = (64, 128, 256)
+        responses = list(pool.map(lambda w: client.get(picture, params={"w": w, "format": "png"}), widths))
+    assert {r.status_code for r in responses} == {200}
+    assert len(calls) == 3 and peak == [1]
+
+
+def test_derivatives_of_non_images_are_415(client, asset, env):
+    assert client.get(asset, params={"w": 64}).status_code == 415
+    (env / "assets" / "broken.png").write_bytes(b"not a png")
+    assert client.get("/assets/broken.png", params={"format": "jpeg"}).status_code == 415
+
+
+def test_derivatives_without_pillow_are_501(client, picture, in_thread_pool, monkeypatch):
+    def no_pillow(*args):
+        raise ImportError("No module named 'PIL'")
+
+    monkeypatch.setattr(assets, "make_derivative", no_pillow)
+    assert client.get(picture, params={"w": 64}).status_code == 501
+    # The original is still served.
+    assert client.get(picture).status_code == 200
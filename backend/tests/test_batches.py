@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import fakes.replicate
+from app.routers.batches.jobs import BatchJob, get_batch_store
+from app.routers.predictions.schemas import PredictionCreate
+from tests.support import SEEDED, status
+
+
+def _events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_event_stream_resumes_after_last_event_id(client, wait_until):
+    body = {"model": "a/b", "cache": False, "items": [{"input": {"prompt": str(i)}} for i in range(4)]}
+    job = client.post("/batches", json=body).json()
+    wait_until(lambda: client.get(f"/batches/{job['id']}").json()["status"] == "completed")
+
+    events = _events(client.get(f"/batches/{job['id']}/events").text)
+    assert [event_id for event_id, _, _ in events] == ["0", "1", "2", "3", None]
+    assert events[-1][1] == "done" and events[-1][2]["succeeded"] == 4
+    assert sorted(data["index"] for _, kind, data in events if kind == "result") == [0, 1, 2, 3]
+
+    resumed = _events(client.get(f"/batches/{job['id']}/events", headers={"Last-Event-ID": "1"}).text)
+    assert [(event_id, kind) for event_id, kind, _ in resumed] == [("2", "result"), ("3", "result"), (None, "done")]
+    assert [data for _, _, data in resumed[:2]] == [data for _, _, data in events[2:4]]
+
+    after = _events(client.get(f"/batches/{job['id']}/events", params={"after": 3}).text)
+    assert [kind for _, kind, _ in after] == ["done"]
+
+
+def test_ndjson_results_and_unknown_batches(client, wait_until):
+    job = client.post("/batches", json={"model": "a/b", "items": [{"input": {"seed": 1}}]}).json()
+    wait_until(lambda: client.get(f"/batches/{job['id']}").json()["status"] == "completed")
+    lines = [json.loads(line) for line in client.get(f"/batches/{job['id']}/results").text.splitlines()]
+    assert [line["type"] for line in lines] == ["result", "done"]
+    assert client.get("/batches/missing/events").status_code == 404
+
+
+def test_keepalive_is_yielded_without_holding_the_condition():
+    async def main():
+        job = BatchJob([PredictionCreate(model="a/b")], concurrency=1)
+        stream = job.follow(keepalive=0.01)
+        assert await stream.__anext__() is None
+        # The consumer is parked on the keep-alive; publishing must not wait for it.
+        await asyncio.wait_for(job._publish({"index": 0, "status": "succeeded"}), 0.5)
+        assert (await stream.__anext__())["seq"] == 0
+        await job._finish("completed")
+        assert [item async for item in stream] == []
+
+    asyncio.run(main())
+
+
+def test_cancel_stops_upstream_predictions_not_shared_outside_the_batch(client, wait_until):
+    fakes.replicate.behavior.update({"queue_latency": "5"})
+    outside = client.post("/predictions", json=SEEDED).json()
+    items = [{"input": {"prompt": "0"}}, {"input": {"prompt": "1"}}, {"input": SEEDED["input"]}]
+    job = client.post("/batches", json={"model": "a/b", "items": items}).json()
+    running = get_batch_store().get(job["id"])._predictions
+    wait_until(lambda: len(running) == 3)
+    own = [pid for pid in running.values() if pid != outside["id"]]
+
+    summary = client.delete(f"/batches/{job['id']}").json()
+    assert (summary["status"], summary["canceled"], summary["failed"]) == ("canceled", 3, 0)
+    assert fakes.replicate.stats["canceled"] == 2
+    assert [status(client, pid) for pid in own] == ["canceled", "canceled"]
+    # Joined onto another request's prediction, so that one keeps running.
+    assert status(client, outside["id"]) == "starting"
+    assert client.get("/predictions/scheduler/stats").json()["providers"]["replicate"]["active"] == 1
+
+
+def test_summary_counts_canceled_items_apart_from_failures():
+    job = BatchJob([PredictionCreate(model="a/b")] * 4, concurrency=1)
+    job.results = [{"status": "succeeded"}, {"status": "failed"}, {"status": "canceled"}]
+    summary = job.summary()
+    assert (summary["succeeded"], summary["failed"], summary["canceled"]) == (1, 1, 1)
+    job.status = "canceled"
+    assert job.summary()["canceled"] == 2
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+from app.core.cache import ResultCache, cache_key, is_cacheable, is_pinned
+from app.core.config import get_settings
+from fakes.behavior import PNG_BYTES
+from tests.support import SEEDED, cached, status
+
+
+def test_cache_key_ignores_input_order_and_needs_a_seed():
+    assert cache_key("a/b", {"seed": 1, "prompt": "x"}) == cache_key("a/b", {"prompt": "x", "seed": 1})
+    assert cache_key("a/b", {"seed": 1}) != cache_key("a/b", {"seed": 2})
+    assert is_cacheable({"seed": 1})
+    assert not is_cacheable({"prompt": "x"})
+
+
+def test_entries_expire_after_their_ttl(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path), ttl=60)
+        await cache.put("short", {"id": "a"}, ttl=0.05)
+        await cache.put("long", {"id": "b"})
+        assert await cache.get("short") == {"id": "a"}
+        await asyncio.sleep(0.1)
+        assert await cache.get("short") is None
+        assert await cache.get("long") == {"id": "b"}
+        assert cache.stats.expirations == 1
+
+    asyncio.run(main())
+
+
+def test_per_entry_ttl_cannot_outlive_the_cache_ttl(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path), ttl=0.05)
+        await cache.put("k", {"id": "a"}, ttl=3600)
+        await asyncio.sleep(0.1)
+        assert await cache.get("k") is None
+
+    asyncio.run(main())
+
+
+def test_expiry_survives_a_restart(tmp_path):
+    async def main():
+        await ResultCache(str(tmp_path), ttl=60).put("k", {"id": "a"}, ttl=0.05)
+        assert await ResultCache(str(tmp_path), ttl=60).get("k") == {"id": "a"}
+        await asyncio.sleep(0.1)
+        assert await ResultCache(str(tmp_path), ttl=60).get("k") is None
+
+    asyncio.run(main())
+
+
+def test_disk_tier_evicts_oldest_entries_past_max_bytes(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path), memory_entries=10, max_bytes=2500)
+        for name in ("first", "second", "third"):
+            await cache.put(name, {"id": name}, assets=[("0.bin", b"x" * 1000)])
+            time.sleep(0.01)
+        snapshot = cache.snapshot()
+        assert snapshot["evictions"] >= 1
+        assert snapshot["disk_bytes"] <= 2500
+        assert await cache.get("first") is None
+        assert (await cache.get("third"))["cached_assets"] == ["0.bin"]
+        assert cache.asset_path("third", "0.bin").read_bytes() == b"x" * 1000
+
+    asyncio.run(main())
+
+
+def test_eviction_also_drops_the_memory_copy(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path), memory_entries=10, max_bytes=1500)
+        await cache.put("first", {"id": "first"}, assets=[("0.bin", b"x" * 1000)])
+        time.sleep(0.01)
+        await cache.put("second", {"id": "second"}, assets=[("0.bin", b"x" * 1000)])
+        assert cache.stats.evictions == 1
+        assert "first" not in cache._memory
+        assert await cache.get("first") is None
+
+    asyncio.run(main())
+
+
+def test_memory_tier_is_bounded(tmp_path):
+    async def main():
+        cache = ResultCache(str(tmp_path), memory_entries=2)
+        for name in ("a", "b", "c"):
+            await cache.put(name, {"id": name})
+        assert cache.snapshot()["memory_entries"] == 2
+        # Dropped from memory, still served from disk.
+        assert await cache.get("a") == {"id": "a"}
+        assert cache.stats.disk_hits == 1
+
+    asyncio.run(main())
+
+
+def test_cache_hits_serve_backend_urls_for_stored_assets(monkeypatch, client, wait_until):
+    monkeypatch.setenv("CACHE_STORE_ASSETS", "1")
+    get_settings.cache_clear()
+    prediction = client.post("/predictions", json=SEEDED).json()
+    wait_until(lambda: status(client, prediction["id"]) == "succeeded")
+
+    hit = wait_until(lambda: cached(client, SEEDED))
+    url = hit["output"][0]
+    assert url.startswith("http://testserver/predictions/cache/files/")
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == PNG_BYTES
+    assert client.get("/predictions/cache/files/nope/0.png").status_code == 404
+
+
+def test_unpinned_models_are_cached_for_a_bounded_time(monkeypatch, client, wait_until):
+    assert is_pinned("a/b:abc123") and not is_pinned("a/b")
+    monkeypatch.setenv("CACHE_UNPINNED_TTL", "0.3")
+    get_settings.cache_clear()
+    prediction = client.post("/predictions", json=SEEDED).json()
+    wait_until(lambda: status(client, prediction["id"]) == "succeeded")
+    wait_until(lambda: cached(client, SEEDED))
+
+    time.sleep(0.4)
+    assert client.post("/predictions", json=SEEDED).json()["id"] != prediction["id"]
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import random
+
+import httpx
+import pytest
+
+import fakes.behavior
+import fakes.fal
+import fakes.luma
+from fakes.behavior import Behavior, parse_latency
+
+FAST = {"queue_latency": "0.01", "run_latency": "0.01", "seed": 1}
+
+
+@pytest.fixture(autouse=True)
+def reset_fakes():
+    for fake in (fakes.fal, fakes.luma):
+        fake.behavior.update({**Behavior.DEFAULTS, **FAST})
+        fake.stats.update(fakes.behavior.new_stats())
+    yield
+    fakes.fal.requests.clear()
+    fakes.luma.generations.clear()
+    fakes.luma.callbacks.clear()
+
+
+@pytest.fixture
+def callbacks():
+    """Webhooks/callbacks the fakes send, as parsed JSON bodies."""
+    received = []
+
+    def record(request):
+        received.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    fakes.behavior._callback_client = httpx.AsyncClient(transport=httpx.MockTransport(record))
+    return received
+
+
+def _client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://fake")
+
+
+def _received(callbacks):
+    async def get():
+        return callbacks
+    return get
+
+
+async def _poll(get, done, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        value = await get()
+        if done(value):
+            return value
+        assert asyncio.get_running_loop().time() < deadline, value
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize("spec, low, high", [
+    ("0.5", 0.5, 0.5), ("fixed:0.25", 0.25, 0.25), ("uniform:0.1,0.2", 0.1, 0.2),
+    ("normal:-5,0.1", 0.0, 0.0), ("lognormal:1.0,0.1", 0.5, 2.0), ("exp:0.5", 0.0, 50.0),
+])
+def test_latency_specs(spec, low, high):
+    sample = parse_latency(spec)
+    rng = random.Random(1)
+    assert all(low <= sample(rng) <= high for _ in range(100))
+
+
+@pytest.mark.parametrize("spec", ["", "fast", "uniform:1", "lognormal:0,1", "exp:-1", "gamma:1,2"])
+def test_invalid_latency_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_latency(spec)
+
+
+def test_rate_limit_is_a_token_bucket(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(fakes.behavior.time, "monotonic", lambda: now[0])
+    behavior = Behavior(rate_limit=2, burst=3, retry_after=7)
+    stats = fakes.behavior.new_stats()
+
+    assert [behavior.admit(stats) is None for _ in range(4)] == [True, True, True, False]
+    rejected = behavior.admit(stats)
+    assert rejected.status_code == 429 and rejected.headers["retry-after"] == "7"
+    assert stats["throttled"] == 2
+    now[0] += 0.5  # refills one token at 2/s
+    assert [behavior.admit(stats) is None for _ in range(2)] == [True, False]
+
+
+def test_config_can_be_changed_at_runtime():
+    async def main():
+        async with _client(fakes.luma.app) as client:
+            response = await client.put("/_fake/config", json={"throttle_rate": 1, "retry_after": 3})
+            assert response.json()["throttle_rate"] == 1
+            rejected = await client.post("/dream-machine/v1/generations", json={"prompt": "x"})
+            assert rejected.status_code == 429 and rejected.headers["retry-after"] == "3"
+
+            for invalid in ({"nope": 1}, {"failure_rate": 2}, {"run_latency": "soon"}):
+                assert (await client.put("/_fake/config", json=invalid)).status_code == 422
+            # Rejected updates change nothing.
+            assert (await client.get("/_fake/config")).json()["run_latency"] == "0.01"
+            assert (await client.get("/_fake/stats")).json()["throttled"] == 1
+            assert (await client.delete("/_fake/stats")).json()["throttled"] == 0
+
+    asyncio.run(main())
+
+
+def test_fal_request_runs_through_the_queue(callbacks):
+    async def main():
+        async with _client(fakes.fal.app) as client:
+            submitted = (await client.post("/fal-ai/flux/dev?fal_webhook=http://hook/fal",
+                                           json={"prompt": "a cat", "seed": 3})).json()
+            assert submitted["status_url"] == f"http://fake/fal-ai/flux/requests/{submitted['request_id']}/status"
+            status = await _poll(lambda: client.get(submitted["status_url"]),
+                                 lambda r: r.json()["status"] == "COMPLETED")
+            assert "inference_time" in status.json()["metrics"]
+            result = (await client.get(submitted["response_url"])).json()
+            assert result["seed"] == 3 and result["images"][0]["url"].endswith(".png")
+            assert (await client.get(result["images"][0]["url"])).headers["content-type"] == "image/png"
+            await _poll(_received(callbacks), bool)
+
+            video = (await client.post("/fal-ai/kling-video/v1", json={"prompt": "a cat"})).json()
+            await _poll(lambda: client.get(video["status_url"]), lambda r: r.json()["status"] == "COMPLETED")
+            assert (await client.get(video["response_url"])).json()["video"]["content_type"] == "video/mp4"
+            assert (await client.put(video["cancel_url"])).status_code == 400
+
+    asyncio.run(main())
+    assert callbacks[0]["status"] == "OK" and callbacks[0]["payload"]["seed"] == 3
+    assert fakes.fal.stats["created"] == 2 and fakes.fal.stats["succeeded"] == 2
+
+
+def test_fal_requests_can_be_cancelled():
+    fakes.fal.behavior.update({"queue_latency": "5"})
+
+    async def main():
+        async with _client(fakes.fal.app) as client:
+            submitted = (await client.post("/fal-ai/flux/dev", json={"prompt": "a cat"})).json()
+            assert (await client.put(submitted["cancel_url"])).status_code == 202
+            assert (await client.get(submitted["status_url"])).json()["status"] == "CANCELLED"
+            assert (await client.get(submitted["response_url"])).status_code == 400
+
+    asyncio.run(main())
+    assert fakes.fal.stats["canceled"] == 1
+
+
+def test_luma_generation_completes_and_calls_back(callbacks):
+    async def main():
+        async with _client(fakes.luma.app) as client:
+            assert (await client.post("/dream-machine/v1/generations", json={})).status_code == 400
+            created = (await client.post("/dream-machine/v1/generations",
+                                         json={"prompt": "a cat", "callback_url": "http://hook/luma"})).json()
+            assert created["state"] == "queued" and "callback_url" not in created["request"]
+            url = f"/dream-machine/v1/generations/{created['id']}"
+            done = await _poll(lambda: client.get(url), lambda r: r.json()["state"] == "completed")
+            video = done.json()["assets"]["video"]
+            assert (await client.get(video)).headers["content-type"] == "video/mp4"
+            await _poll(_received(callbacks), lambda c: len(c) == 2)
+
+            # Deleting a finished generation is not a cancellation.
+            assert (await client.delete(url)).status_code == 204
+            assert (await client.get(url)).status_code == 404
+
+    asyncio.run(main())
+    assert [c["state"] for c in callbacks] == ["dreaming", "completed"]
+    assert fakes.luma.stats["succeeded"] == 1 and fakes.luma.stats["canceled"] == 0
+
+
+def test_luma_delete_cancels_a_running_generation():
+    fakes.luma.behavior.update({"queue_latency": "5"})
+
+    async def main():
+        async with _client(fakes.luma.app) as client:
+            created = (await client.post("/dream-machine/v1/generations", json={"prompt": "a cat"})).json()
+            assert (await client.delete(f"/dream-machine/v1/generations/{created['id']}")).status_code == 204
+            assert len(fakes.behavior._background_tasks) >= 1
+
+    asyncio.run(main())
+    assert fakes.luma.stats["canceled"] == 1
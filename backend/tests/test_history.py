@@ -0,0 +1,149 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from app.models.history import HistoryStore
+from tests.support import SEEDED, cached, create_concurrently, status
+
+
+def _prediction(prediction_id, created_at, **extra):
+    return {"id": prediction_id, "model": "a/b", "status": "succeeded", "created_at": created_at,
+            "input": {"prompt": prediction_id}, **extra}
+
+
+def _walk(history, limit, **filters):
+    async def pages():
+        items, cursor, seen = [], None, 0
+        while True:
+            page, cursor = await history.page(limit, cursor, **filters)
+            items.extend(page)
+            seen += 1
+            if cursor is None:
+                return items, seen
+    return pages()
+
+
+def test_keyset_paging_crosses_cursor_boundaries_with_tied_timestamps(tmp_path):
+    async def main():
+        history = HistoryStore(str(tmp_path / "h.db"), flush_interval=0.01)
+        # Several rows share a created_at, so the id tie-breaker decides the order.
+        stamps = {"p0": 100.0, "p1": 101.0, "p2": 101.0, "p3": 101.0, "p4": 102.0, "p5": 103.0, "p6": 103.0}
+        for prediction_id, created_at in stamps.items():
+            history.record(_prediction(prediction_id, created_at), user_id="u" if prediction_id < "p4" else "v")
+        await history.flush()
+
+        expected = sorted(stamps, key=lambda pid: (stamps[pid], pid), reverse=True)
+        for limit in (1, 2, 3, 7, 50):
+            items, pages = await _walk(history, limit)
+            assert [item["id"] for item in items] == expected
+            assert pages == max(1, -(-len(expected) // limit))
+
+        items, _ = await _walk(history, 2, user_id="u")
+        assert [item["id"] for item in items] == ["p3", "p2", "p1", "p0"]
+        await history.close()
+
+    asyncio.run(main())
+
+
+def test_updates_keep_the_owner_and_batch_from_creation(tmp_path):
+    async def main():
+        history = HistoryStore(str(tmp_path / "h.db"), flush_interval=0.01)
+        history.record(_prediction("p", 1.0, status="starting"), user_id="u", batch_id="b")
+        await history.flush()
+        history.record(_prediction("p", 1.0, output=["x.png"]))
+        await history.flush()
+        item = await history.get("p")
+        assert (item["user_id"], item["batch_id"], item["status"], item["output"]) == ("u", "b", "succeeded", ["x.png"])
+        items, _ = await history.page(10, batch_id="b")
+        assert [i["id"] for i in items] == ["p"]
+        await history.close()
+
+    asyncio.run(main())
+
+
+def test_shared_rows_belong_to_the_requester(tmp_path):
+    async def main():
+        history = HistoryStore(str(tmp_path / "h.db"), flush_interval=0.01)
+        history.record(_prediction("p", 1.0), user_id="owner")
+        history.record(_prediction("p", 1.0), user_id="other", shared=True)
+        await history.flush()
+        items, _ = await history.page(10, user_id="other")
+        assert [(i["id"], i["prediction_id"]) for i in items] == [("p:other:", "p")]
+        assert (await history.get("p"))["user_id"] == "owner"
+        await history.close()
+
+    asyncio.run(main())
+
+
+def test_failed_flush_keeps_the_rows_for_the_next_one(monkeypatch, tmp_path):
+    async def main():
+        history = HistoryStore(str(tmp_path / "h.db"), flush_interval=60)
+        history.record(_prediction("p", 1.0, status="starting"), user_id="u")
+        history.record(_prediction("q", 2.0))
+        write = history._write
+
+        def fail(rows):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(history, "_write", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            await history.flush()
+        history.record(_prediction("p", 1.0, output=["x.png"]))
+
+        monkeypatch.setattr(history, "_write", write)
+        await history.flush()
+        item = await history.get("p")
+        assert (item["user_id"], item["status"], item["output"]) == ("u", "succeeded", ["x.png"])
+        assert await history.get("q") is not None
+        await history.close()
+
+    asyncio.run(main())
+
+
+def test_close_waits_for_a_write_in_progress_and_closes_readers(monkeypatch, tmp_path):
+    async def main():
+        history = HistoryStore(str(tmp_path / "h.db"), flush_interval=60)
+        assert await history.get("p") is None
+        reader = history._readers[0]
+        open_writer = history._open_writer
+
+        def slow_open_writer():
+            time.sleep(0.1)
+            open_writer()
+
+        monkeypatch.setattr(history, "_open_writer", slow_open_writer)
+        history.record(_prediction("p", 1.0))
+        flushing = asyncio.create_task(history.flush())
+        await asyncio.sleep(0.01)
+        await history.close()
+        await flushing
+
+        assert history._readers == [] and history._writer is None
+        with pytest.raises(sqlite3.ProgrammingError):
+            reader.execute("SELECT 1")
+        reopened = HistoryStore(str(tmp_path / "h.db"))
+        assert (await reopened.get("p"))["status"] == "succeeded"
+        await reopened.close()
+
+    asyncio.run(main())
+
+
+def test_history_endpoint_rejects_bad_cursors(client):
+    assert client.get("/history", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/history").json() == {"items": [], "next_cursor": None}
+
+
+def test_history_records_cache_hits_and_joined_requests(client, wait_until):
+    bodies = [{**SEEDED, "user_id": user} for user in ("alice", "bob")]
+    first, second = create_concurrently(client, bodies)
+    assert first["id"] == second["id"]
+    wait_until(lambda: status(client, first["id"]) == "succeeded")
+    wait_until(lambda: cached(client, {**SEEDED, "user_id": "carol"}))
+
+    for user in ("alice", "bob", "carol"):
+        items = wait_until(lambda: client.get("/history", params={"user_id": user}).json()["items"])
+        assert [item["prediction_id"] for item in items] == [first["id"]]
+        wait_until(lambda: client.get("/history", params={"user_id": user}).json()["items"][0]["status"]
+                   == "succeeded")
@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import logs
+from app.core.metrics import HTTP_ERRORS, HTTP_REQUESTS, Counter, Histogram, Registry
+from app.core.middleware import MetricsMiddleware
+
+
+def test_quantiles_interpolate_inside_the_bucket():
+    histogram = Histogram("h", "doc", buckets=(1.0, 2.0, 4.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.5, 0.5, 1.5, 1.5):
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == pytest.approx(1.0)
+    assert histogram.quantile(0.75) == pytest.approx(1.5)
+    assert histogram.quantile(1.0) == pytest.approx(2.0)
+    histogram.observe(100.0)
+    # Past the last bound the estimate is capped there, as in PromQL.
+    assert histogram.quantile(0.99) == 4.0
+
+
+def test_exposition_is_cumulative_and_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("jobs_total", "Jobs.", ("name",)))
+    histogram = registry.register(Histogram("wait_seconds", "Wait.", ("kind",), buckets=(0.1, 1.0)))
+    counter.inc(name='a "quoted"\nname')
+    histogram.observe(0.05, kind="x")
+    histogram.observe(0.5, kind="x")
+    histogram.observe(5.0, kind="x")
+
+    lines = registry.expose().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{name="a \\"quoted\\"\\nname"} 1' in lines
+    assert 'wait_seconds_bucket{kind="x",le="0.1"} 1' in lines
+    assert 'wait_seconds_bucket{kind="x",le="1"} 2' in lines
+    assert 'wait_seconds_bucket{kind="x",le="+Inf"} 3' in lines
+    assert 'wait_seconds_sum{kind="x"} 5.55' in lines
+    assert 'wait_seconds_count{kind="x"} 3' in lines
+
+
+def _app(sample_rate):
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, sample_rate=sample_rate)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: str):
+        return {"id": item_id}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_middleware_labels_by_route_template_and_counts_errors(caplog):
+    client = _app(sample_rate=0)
+    before = HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200")
+    errors = HTTP_ERRORS.value(method="GET", route="/boom")
+
+    with caplog.at_level(logging.INFO, logger="app.access"):
+        responses = [client.get(f"/items/{index}") for index in range(3)]
+        assert client.get("/boom").status_code == 500
+        assert client.get("/nowhere").status_code == 404
+
+    assert all(len(r.headers["x-request-id"]) == 32 for r in responses)
+    assert HTTP_REQUESTS.value(method="GET", route="/items/{item_id}", status="200") == before + 3
+    assert HTTP_REQUESTS.value(method="GET", route="unmatched", status="404") >= 1
+    assert HTTP_ERRORS.value(method="GET", route="/boom") == errors + 1
+    # With sampling off only the server error is logged.
+    assert [record.getMessage().split()[:3] for record in caplog.records] == [["GET", "/boom", "500"]]
+
+
+def test_metrics_endpoints(client):
+    client.get("/health")
+    text = client.get("/metrics")
+    assert text.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="GET",route="/health",status="200"}' in text.text
+    summary = client.get("/metrics/summary").json()
+    rows = [row for row in summary["http_request_duration_seconds"] if row["route"] == "/health"]
+    assert rows and rows[0]["count"] >= 1 and rows[0]["p50"] is not None
+
+
+def test_logging_keeps_existing_root_handlers(caplog):
+    logs.stop_logging()
+    root = logging.getLogger()
+    logs.configure_logging("info")
+    try:
+        assert caplog.handler in root.handlers
+        logging.getLogger("app.test").warning("still captured")
+        assert "still captured" in caplog.text
+        assert logging.getLogger("httpx").level == logging.WARNING
+    finally:
+        queue_handler = logs._queue_handler
+        logs.stop_logging()
+    assert queue_handler not in root.handlers
@@ -0,0 +1,71 @@
+import json
+import time
+
+import pytest
+
+import fakes.replicate
+from app.core.config import get_settings
+from app.routers.predictions.webhooks import sign
+from tests.support import SEEDED, WEBHOOK_SECRET, status
+
+
+def _post_webhook(client, payload, secret=WEBHOOK_SECRET):
+    body = json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"}
+    if secret:
+        timestamp = int(time.time())
+        headers.update({
+            "webhook-id": "msg_test",
+            "webhook-timestamp": str(timestamp),
+            "webhook-signature": sign(secret, "msg_test", timestamp, body),
+        })
+    return client.post("/predictions/webhook", content=body, headers=headers)
+
+
+def test_prediction_completes_through_webhooks(client, wait_until):
+    prediction = client.post("/predictions", json={"model": "a/b", "input": {"prompt": "x"}}).json()
+    assert prediction["status"] == "starting"
+    wait_until(lambda: status(client, prediction["id"]) == "succeeded")
+    assert client.get("/predictions/scheduler/stats").json()["providers"]["replicate"]["active"] == 0
+
+
+def test_webhooks_for_unknown_predictions_are_ignored(client):
+    response = _post_webhook(client, {"id": "forged", "status": "succeeded", "output": ["x"]})
+    assert response.json() == {"ok": True, "ignored": True}
+    assert client.get("/history/forged").status_code == 404
+    assert _post_webhook(client, []).status_code == 400
+
+
+@pytest.mark.parametrize("secret", [None, "whsec_d3Jvbmc="])
+def test_unsigned_or_badly_signed_webhooks_are_rejected(lost_webhooks, secret):
+    client = lost_webhooks
+    fakes.replicate.behavior.update({"queue_latency": "5"})
+    prediction = client.post("/predictions", json=SEEDED).json()
+    forged = {"id": prediction["id"], "status": "succeeded", "output": ["http://evil.test/x.png"]}
+    assert _post_webhook(client, forged, secret).status_code == 401
+    assert status(client, prediction["id"]) == "starting"
+
+
+def test_webhooks_are_rejected_without_a_secret_unless_allowed(monkeypatch, client):
+    monkeypatch.delenv("REPLICATE_WEBHOOK_SECRET")
+    get_settings.cache_clear()
+    payload = {"id": "unknown", "status": "succeeded"}
+    assert _post_webhook(client, payload, secret=None).status_code == 401
+
+    monkeypatch.setenv("REPLICATE_WEBHOOK_ALLOW_UNSIGNED", "1")
+    get_settings.cache_clear()
+    assert _post_webhook(client, payload, secret=None).json() == {"ok": True, "ignored": True}
+
+
+def test_forged_result_for_a_running_prediction_is_notcached(monkeypatch, lost_webhooks, wait_until):
+    client = lost_webhooks
+    monkeypatch.delenv("REPLICATE_WEBHOOK_SECRET")
+    monkeypatch.setenv("REPLICATE_WEBHOOK_ALLOW_UNSIGNED", "1")
+    get_settings.cache_clear()
+    fakes.replicate.behavior.update({"queue_latency": "5"})
+    prediction = client.post("/predictions", json=SEEDED).json()
+    forged = {"id": prediction["id"], "status": "succeeded", "output": ["http://evil.test/x.png"]}
+    assert _post_webhook(client, forged, secret=None).json() == {"ok": True}
+    # The result is checked upstream (still queued there) instead of cached.
+    wait_until(lambda: fakes.replicate.stats["gets"] >= 1)
+    assert client.get("/predictions/cache/stats").json()["stores"] == 0
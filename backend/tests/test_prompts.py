@@ -0,0 +1,103 @@
+import json
+import re
+from pathlib import Path
+
+import httpx
+import openai
+import pytest
+
+from app.core.config import get_settings
+from app.core.prompt_engine import Directive, Presets, PromptEngine, get_llm_enhancer, get_prompt_engine
+
+SHARED_PRESETS = Path(__file__).resolve().parents[2] / "frontend" / "constants" / "promptPresets.json"
+
+
+@pytest.mark.parametrize("prompt", ["", "   ", "\n\t", ".", "?!", " -- "])
+@pytest.mark.parametrize("target", ["image", "video"])
+def test_blank_prompts_are_rejected(client, prompt, target):
+    assert client.post("/prompts/enhance", json={"prompt": prompt, "target": target}).status_code == 422
+
+
+def test_presets_come_from_the_file_the_frontend_reads(client):
+    shared = json.loads(SHARED_PRESETS.read_text())
+    presets = client.get("/prompts/presets").json()
+    assert presets["styles"] == sorted(shared["styles"])
+    assert set(shared["genres"]) <= set(presets["genres"])
+    assert {"science fiction", "cyberpunk"} <= set(presets["genres"])
+
+
+def test_genre_name_is_a_mood_keyword_like_the_frontend():
+    engine = get_prompt_engine()
+    groups = dict(engine.enhance("a castle", genre="horror").groups)
+    assert groups["mood"][0] == "horror" and "ominous" in groups["mood"]
+    assert "dark lighting" in groups["lighting"]
+    # No enhancers of its own yet, so only the name is added.
+    groups = dict(engine.enhance("a castle", genre="science fiction").groups)
+    assert groups["mood"] == ("science fiction",)
+    assert "neon lighting" not in groups["lighting"]
+
+
+def test_missing_presets_fall_back_to_quality_markers_only():
+    groups = dict(PromptEngine(Directive(), Presets()).enhance("a castle", style="anime").groups)
+    assert groups["style"] == ("anime",)
+    assert groups["technical"] == Presets().quality[:3]
+
+
+def test_video_prompt_is_enhanced(client):
+    result = client.post("/prompts/enhance", json={"prompt": "  a cat sleeps  ", "target": "video"}).json()
+    assert result["target"] == "video"
+    assert "a cat sleeps" in result["prompt"]
+    assert result["source"] == "engine"
+
+
+@pytest.mark.parametrize("prompt", [
+    "a cat sleeps",
+    "a slow pan over a quiet harbor at dawn",
+    "A knight rides. The castle burns. Dragons circle above. Rain falls. Thunder cracks.",
+])
+def test_video_prompts_meet_the_directive_targets(prompt):
+    engine = get_prompt_engine()
+    low, high = engine.directive.video_sentences
+    result = engine.enhance(prompt, target="video", genre="horror")
+    sentences = re.split(r"(?<=[.!?])\s+", result.prompt)
+    assert low <= len(sentences) <= high
+    assert engine.directive.video_words[0] <= len(result.prompt.split()) <= engine.directive.video_words[1]
+    for word in re.findall(r"\w+", prompt):
+        assert word in result.prompt
+
+
+def test_video_enhancement_never_drops_the_users_words():
+    engine = get_prompt_engine()
+    prompt = " ".join(f"word{index}" for index in range(120))
+    result = engine.enhance(prompt, target="video")
+    assert prompt in result.prompt
+    assert len(re.split(r"(?<=[.!?])\s+", result.prompt)) == engine.directive.video_sentences[0]
+    with pytest.raises(ValueError):
+        engine.enhance(".", target="video")
+
+
+class _FailingCompletions:
+    async def create(self, **kwargs):
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.test"))
+
+
+class _FailingOpenAI:
+    class chat:
+        completions = _FailingCompletions()
+
+
+def test_openai_failures_are_502(monkeypatch, client):
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(get_llm_enhancer(), "_get_client", lambda: _FailingOpenAI)
+    get_settings.cache_clear()
+    response = client.post("/prompts/enhance", json={"prompt": "a cat", "use_llm": True})
+    assert response.status_code == 502
+
+
+def test_batch_reports_failed_items_in_place(client):
+    items = [{"prompt": "a cat"}, {"prompt": "a dog", "use_llm": True}, {"prompt": "a fox"}]
+    response = client.post("/prompts/enhance/batch", json={"items": items})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert results[1] == {"error": "LLM enhancement is not configured", "status_code": 503}
+    assert results[0]["prompt"].startswith("a cat") and results[2]["prompt"].startswith("a fox")
@@ -0,0 +1,264 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import fakes.replicate
+from app.core import http
+from app.core.cache import ResultCache, cache_key
+from app.core.metrics import MAX_MODEL_LABELS, model_label
+from app.core.scheduler import (
+    BATCH,
+    INTERACTIVE,
+    Overloaded,
+    ProviderLimits,
+    Scheduler,
+    SingleFlight,
+    get_scheduler,
+    get_single_flight,
+)
+from app.main import create_app
+from app.models.history import get_history_store
+from app.routers.predictions import service
+from app.routers.predictions.client import ReplicateClient
+from app.routers.predictions.schemas import PredictionCreate
+from app.routers.predictions.store import PredictionStore
+from tests.support import SEEDED, cached, create_concurrently, status
+
+ONE_AT_A_TIME = {"p": ProviderLimits(concurrency=1, model_concurrency=1, rate=1000.0, burst=1000)}
+
+
+def test_interactive_waiters_are_served_before_batch_and_fifo_within_a_priority():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0)
+        held = await scheduler.acquire("p", "m")
+        order = []
+
+        async def waiter(name, priority):
+            slot = await scheduler.acquire("p", "m", priority)
+            order.append(name)
+            scheduler.release(slot)
+
+        tasks = [asyncio.create_task(waiter(name, priority)) for name, priority in (
+            ("batch-1", BATCH), ("interactive-1", INTERACTIVE),
+            ("batch-2", BATCH), ("interactive-2", INTERACTIVE),
+        )]
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["p"]["queued"] == 4
+        scheduler.release(held)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["interactive-1", "interactive-2", "batch-1", "batch-2"]
+
+
+def test_release_frees_the_slot_once():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0)
+        slot = await scheduler.acquire("p", "m")
+        waiting = asyncio.create_task(scheduler.acquire("p", "m"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+
+        scheduler.release(slot)
+        scheduler.release(slot)
+        second = await asyncio.wait_for(waiting, 1)
+        assert scheduler.snapshot()["p"]["active"] == 1
+        scheduler.release(second)
+        assert scheduler.snapshot()["p"]["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0)
+        slot = await scheduler.acquire("p", "m")
+        waiting = asyncio.create_task(scheduler.acquire("p", "m"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler.snapshot()["p"]["queued"] == 0
+        scheduler.release(slot)
+        assert scheduler.snapshot()["p"]["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_slot_is_released_and_reported_when_it_times_out():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0.05)
+        expired = []
+        slot = await scheduler.acquire("p", "m")
+        slot.on_expire = expired.append
+        await asyncio.sleep(0.15)
+        assert slot.released
+        assert expired == [slot]
+        assert scheduler.snapshot()["p"]["active"] == 0
+
+    asyncio.run(main())
+
+
+def test_full_queue_turns_away_callers_with_a_timeout():
+    async def main():
+        limits = {"p": ProviderLimits(concurrency=1, model_concurrency=1, rate=1000.0, burst=1000, max_queue=1)}
+        scheduler = Scheduler(limits, slot_timeout=0)
+        held = await scheduler.acquire("p", "m", timeout=1)
+        first = asyncio.create_task(scheduler.acquire("p", "m", timeout=5))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await scheduler.acquire("p", "other", timeout=5)
+        assert rejected.value.status_code == 429 and rejected.value.retry_after >= 1
+        # Background callers are not bounded by the queue depth.
+        background = asyncio.create_task(scheduler.acquire("p", "m", BATCH))
+        await asyncio.sleep(0)
+        assert scheduler.snapshot()["p"]["queued"] == 2
+        scheduler.release(held)
+        scheduler.release(await first)
+        scheduler.release(await background)
+
+    asyncio.run(main())
+
+
+def test_admission_timeout_is_503_and_leaves_the_queue():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0)
+        held = await scheduler.acquire("p", "m")
+        with pytest.raises(Overloaded) as rejected:
+            await scheduler.acquire("p", "garbage-model", timeout=0.05)
+        assert rejected.value.status_code == 503
+        snapshot = scheduler.snapshot()["p"]
+        assert snapshot["queued"] == 0 and set(snapshot["models"]) == {"m"}
+        scheduler.release(held)
+
+    asyncio.run(main())
+
+
+def test_idle_lanes_are_dropped():
+    async def main():
+        scheduler = Scheduler(ONE_AT_A_TIME, slot_timeout=0)
+        for index in range(50):
+            scheduler.release(await scheduler.acquire("p", f"model-{index}"))
+        assert scheduler.snapshot()["p"]["models"] == {}
+
+    asyncio.run(main())
+
+
+def test_model_labels_are_bounded():
+    assert model_label("Owner/Name:abc123") == "owner/name"
+    assert model_label("../../etc") == "other"
+    assert model_label("a" * 64) == "other"
+    labels = {model_label(f"spam/model-{index}") for index in range(MAX_MODEL_LABELS * 2)}
+    assert "other" in labels and len(labels) <= MAX_MODEL_LABELS + 1
+
+
+def test_single_flight_shares_until_forgotten():
+    async def main():
+        flights = SingleFlight()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(*(flights.do("k", factory) for _ in range(3)))
+        assert sorted(results) == [(1, False), (1, True), (1, True)]
+        # The key stays joinable until the owner forgets it.
+        assert await flights.do("k", factory) == (1, True)
+        flights.forget("k")
+        assert await flights.do("k", factory) == (2, False)
+
+    asyncio.run(main())
+
+
+def test_identical_seeded_requests_share_one_prediction_then_hit_the_cache(client, wait_until):
+    predictions = create_concurrently(client, [SEEDED] * 3)
+    assert len({p["id"] for p in predictions}) == 1
+    assert fakes.replicate.stats["created"] == 1
+
+    wait_until(lambda: status(client, predictions[0]["id"]) == "succeeded")
+    hit = wait_until(lambda: cached(client, SEEDED))
+    assert hit["id"] == predictions[0]["id"]
+    assert fakes.replicate.stats["created"] == 1
+
+
+def test_cache_false_and_unseeded_requests_are_not_coalesced(client):
+    uncached = {**SEEDED, "cache": False}
+    unseeded = {"model": "a/b", "input": {"prompt": "a cat"}}
+    assert len({p["id"] for p in create_concurrently(client, [uncached] * 2)}) == 2
+    assert len({p["id"] for p in create_concurrently(client, [unseeded] * 2)}) == 2
+
+
+def test_lost_webhook_is_reconciled_when_the_slot_expires(monkeypatch, lost_webhooks, wait_until):
+    client = lost_webhooks
+    monkeypatch.setattr(get_scheduler(), "slot_timeout", 0.3)
+    prediction = client.post("/predictions", json=SEEDED).json()
+    assert len(get_single_flight()) == 1
+
+    wait_until(lambda: status(client, prediction["id"]) == "succeeded")
+    assert len(get_single_flight()) == 0
+    assert prediction["id"] not in service._running
+    assert client.get("/predictions/scheduler/stats").json()["providers"]["replicate"]["active"] == 0
+
+    hit = wait_until(lambda: cached(client, SEEDED))
+    assert hit["id"] == prediction["id"]
+    assert fakes.replicate.stats["created"] == 1
+
+
+def test_predictions_release_the_instances_that_admitted_them(tmp_path):
+    async def main():
+        transport = httpx.ASGITransport(app=fakes.replicate.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://fake") as http:
+            client = ReplicateClient(http=http, api_base="http://fake/v1", api_token="t")
+            scheduler, flights = Scheduler(slot_timeout=0), SingleFlight()
+            cache, store = ResultCache(str(tmp_path / "own-cache")), PredictionStore()
+            body = PredictionCreate(**SEEDED)
+
+            prediction = await service.create_prediction(body, store, client, cache, scheduler, flights)
+            assert scheduler.snapshot()["replicate"]["active"] == 1
+            assert len(flights) == 1
+            while (await client.get_prediction(prediction["id"]))["status"] != "succeeded":
+                await asyncio.sleep(0.02)
+            service.record(await client.get_prediction(prediction["id"]), store)
+
+            assert scheduler.snapshot()["replicate"]["active"] == 0
+            assert len(flights) == 0
+            while cache.stats.stores == 0:
+                await asyncio.sleep(0.02)
+            assert (await cache.get(cache_key(body.model, body.input)))["id"] == prediction["id"]
+            await get_history_store().close()
+
+    asyncio.run(main())
+
+
+def test_overloaded_scheduler_answers_429_with_retry_after(monkeypatch, env):
+    monkeypatch.setenv("PROVIDER_LIMITS", '{"replicate": {"concurrency": 1, "max_queue": 0}}')
+    monkeypatch.setenv("SCHEDULER_ADMISSION_TIMEOUT", "0.2")
+    fakes.replicate.behavior.update({"queue_latency": "5"})
+    with TestClient(create_app()) as client:
+        http._client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fakes.replicate.app))
+        assert client.post("/predictions", json={"model": "a/b", "input": {}}).status_code == 201
+        response = client.post("/predictions", json={"model": "a/b", "input": {}})
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+    assert fakes.replicate.stats["created"] == 1
+
+
+def test_abandoned_request_releases_its_slot_without_creating_upstream(tmp_path):
+    async def gone():
+        return True
+
+    async def main():
+        scheduler = Scheduler(slot_timeout=0)
+        body = PredictionCreate(**{**SEEDED, "cache": False})
+        with pytest.raises(service.Abandoned):
+            await service.create_prediction(
+                body, PredictionStore(), ReplicateClient(), ResultCache(str(tmp_path / "c")),
+                scheduler, SingleFlight(), abandoned=gone,
+            )
+        assert scheduler.snapshot()["replicate"]["active"] == 0
+
+    asyncio.run(main())
+    assert fakes.replicate.stats["created"] == 0
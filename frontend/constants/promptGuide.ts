@@ -1,3 +1,5 @@
+import presets from './promptPresets.json';
+
 export const PROMPT_GUIDE = `
 Guide for creating high-quality image generation prompts:
 
@@ -35,6 +37,18 @@ interface PromptLayer {
   style?: string[];
 }
 
+type LayerPresets = Record<string, Partial<Record<keyof PromptLayer, string[]>>>;
+
+// Shared with the backend prompt engine (backend/app/core/prompt_engine.py).
+const STYLE_PRESETS: LayerPresets = presets.styles;
+const GENRE_PRESETS: LayerPresets = presets.genres;
+
+function addPresets(layers: PromptLayer, preset: LayerPresets[string] = {}) {
+  Object.entries(preset).forEach(([layer, values]) => {
+    layers[layer as keyof PromptLayer]?.push(...(values ?? []));
+  });
+}
+
 interface PromptBreakdown {
   layers: PromptLayer;
   combined: string;
@@ -93,35 +107,14 @@ export function validateAndEnhancePrompt(
   if (style) {
     layers?.style?.push(style);
     // Add quality enhancers based on style
-    switch (style.toLowerCase()) {
-      case 'photorealistic':
-        layers?.technical?.push('highly detailed', '8k uhd', 'photorealistic', 'dslr');
-        break;
-      case 'anime':
-        layers?.style?.push('anime style', 'trending on pixiv');
-        break;
-      case 'digital art':
-        layers?.technical?.push('digital painting', 'trending on artstation', 'concept art');
-        break;
-      // Add more style-specific enhancements
-    }
+    addPresets(layers, STYLE_PRESETS[style.toLowerCase()]);
   }
 
   // Add genre-specific elements
   if (genre) {
     layers?.mood?.push(genre);
     // Add genre-specific lighting and mood
-    switch (genre.toLowerCase()) {
-      case 'horror':
-        layers?.lighting?.push('dark lighting', 'dramatic shadows');
-        layers?.mood?.push('ominous', 'foreboding');
-        break;
-      case 'fantasy':
-        layers?.lighting?.push('magical lighting', 'ethereal glow');
-        layers?.mood?.push('mystical', 'enchanting');
-        break;
-      // Add more genre-specific enhancements
-    }
+    addPresets(layers, GENRE_PRESETS[genre.toLowerCase()]);
   }
 
   // Add references
@@ -132,12 +125,7 @@ export function validateAndEnhancePrompt(
     layers?.style?.push(`inspired by ${bookReference}`);
   }
   // Add technical quality enhancers
-  layers?.technical?.push(
-    'highly detailed',
-    'professional', 
-    'sharp focus',
-    'high resolution'
-  );
+  layers?.technical?.push(...presets.quality);
 
   // Combine all layers
   const combined = Object.entries(layers)